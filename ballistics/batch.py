@@ -0,0 +1,336 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .environment import air_density, speed_sound
+from .trajectory import ACCEL_GRAVITY, MAX_SIMULATION_TIME
+
+# Matches the default step of the custom ODE solvers. RK4 at this step stays
+# well below 1e-6 ft of position error on typical small arms trajectories.
+DEFAULT_BATCH_STEP = 1.0 / 60.0
+
+# Smallest number of shots given to a thread. A chunk flown to 3000 ft costs
+# about 15 ms of interpreted per-step work, which holds the GIL, plus about
+# 0.05 ms of array work per shot (measured on one core), so smaller chunks
+# spend most of their time serialized on the GIL.
+MIN_SHOTS_PER_THREAD = 256
+
+
+def atmosphere(temp, pressure, rh, num_shots: int) -> (np.ndarray, np.ndarray):
+    """Calculates the air density and speed of sound for each shot of a batch.
+
+    Parameters
+    ----------
+    temp : float or array_like
+        Temperature in Fahrenheit, either shared or one per shot
+    pressure : float or array_like
+        Air pressure in inHg, either shared or one per shot
+    rh : float or array_like
+        Percent relative humidity, either shared or one per shot
+    num_shots : int
+        Number of shots in the batch
+
+    Returns
+    -------
+    density_air : np.ndarray
+        Air density in lb/ft3 of each shot
+    v_sound : np.ndarray
+        Speed of sound in ft/s of each shot
+    """
+
+    conditions = np.broadcast_arrays(
+        np.asarray(temp, dtype=float),
+        np.asarray(pressure, dtype=float),
+        np.asarray(rh, dtype=float)
+    )
+    if conditions[0].ndim == 0:
+        density_air = air_density(*map(float, conditions), 0.0)
+        v_sound = speed_sound(float(temp), float(rh), 0.0)
+        return np.full(num_shots, density_air), np.full(num_shots, v_sound)
+
+    temp, pressure, rh = (np.broadcast_to(c, (num_shots,)) for c in conditions)
+    density_air = np.array(
+        [air_density(t, p, r, 0.0) for t, p, r in zip(temp, pressure, rh)])
+    v_sound = np.array([speed_sound(t, r, 0.0) for t, r in zip(temp, rh)])
+    return density_air, v_sound
+
+
+def batch_acceleration(
+    traj,
+    v: np.ndarray,
+    v_sound: np.ndarray,
+    bc: np.ndarray,
+    density_air: np.ndarray,
+    wind: np.ndarray
+) -> np.ndarray:
+    """Vectorized `PointMassTrajectory.calculate_acceleration` over a batch.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model providing the drag function
+    v : np.ndarray
+        Velocities in ft/s, shape (N, 3)
+    v_sound, bc, density_air : np.ndarray
+        Per-shot values, shape (N,)
+    wind : np.ndarray
+        Wind velocities in ft/s, shape (N, 3) or (3,)
+
+    Returns
+    -------
+    accel : np.ndarray
+        Accelerations in ft/s2, shape (N, 3)
+    """
+
+    # 8 * 144, the 144 comes from converting in2 to ft2
+    k = 1152.0
+
+    vw = v - wind
+    speed = np.sqrt(np.einsum('ij,ij->i', vw, vw))
+    m = speed / v_sound
+    cd_star = density_air * np.pi * traj.drag_curve(m) / (k * bc)
+    return -(cd_star * speed)[:, None] * vw + ACCEL_GRAVITY
+
+
+def _hermite(y0, y1, m0, m1, s):
+    # Cubic Hermite interpolation on the unit interval, `m0` and `m1` are the
+    # derivatives already scaled by the step size
+    s = s[:, None]
+    s2 = s * s
+    s3 = s2 * s
+    return ((2.0 * s3 - 3.0 * s2 + 1.0) * y0 + (s3 - 2.0 * s2 + s) * m0 +
+            (-2.0 * s3 + 3.0 * s2) * y1 + (s3 - s2) * m1)
+
+
+def _hermite_root(x0, x1, m0, m1, target):
+    # Finds s in [0, 1] where the monotone cubic Hermite reaches the target
+    s = np.clip((target - x0) / (x1 - x0), 0.0, 1.0)
+    for _ in range(4):
+        s2 = s * s
+        s3 = s2 * s
+        x = ((2.0 * s3 - 3.0 * s2 + 1.0) * x0 + (s3 - 2.0 * s2 + s) * m0 +
+             (-2.0 * s3 + 3.0 * s2) * x1 + (s3 - s2) * m1)
+        dx = ((6.0 * s2 - 6.0 * s) * x0 + (3.0 * s2 - 4.0 * s + 1.0) * m0 +
+              (-6.0 * s2 + 6.0 * s) * x1 + (3.0 * s2 - 2.0 * s) * m1)
+        s = np.clip(s - (x - target) / dx, 0.0, 1.0)
+    return s
+
+
+def integrate_to_ranges(
+    fun,
+    y0: np.ndarray,
+    ranges: np.ndarray,
+    h: float = DEFAULT_BATCH_STEP,
+    t_max: float = MAX_SIMULATION_TIME
+) -> (np.ndarray, np.ndarray):
+    """Integrates a batch of states with the classic Runge-Kutta method until
+    each one has passed its last range. Shots that are done are dropped from
+    the batch so the remaining ones do not pay for them.
+
+    Parameters
+    ----------
+    fun : callable
+        `fun(y, index)` returns the derivatives of the states `y` of shape
+        (n, D). `index` holds the positions of those states in the batch, for
+        looking up per-shot parameters. The downrange position and velocity
+        must be at columns 0 and 3.
+    y0 : np.ndarray
+        Initial states, shape (N, D)
+    ranges : np.ndarray
+        Increasing downrange distances in ft, shape (R,) or (N, R). Rows can
+        be padded at the end with NaN.
+    h : float
+        Time step in s
+    t_max : float
+        Maximum simulated time in s
+
+    Returns
+    -------
+    t : np.ndarray
+        Time of flight to each range, shape (N, R). NaN where not reached.
+    y : np.ndarray
+        State at each range, shape (N, R, D). NaN where not reached.
+    """
+
+    y0 = np.asarray(y0, dtype=float)
+    num_shots, dim = y0.shape
+    ranges = np.broadcast_to(
+        np.asarray(ranges, dtype=float), (num_shots, np.shape(ranges)[-1]))
+    num_ranges = ranges.shape[1]
+
+    t_out = np.full((num_shots, num_ranges), np.nan)
+    y_out = np.full((num_shots, num_ranges, dim), np.nan)
+
+    # Index of the next range to be reached by each shot
+    pending = np.zeros(num_shots, dtype=int)
+    num_valid = np.count_nonzero(~np.isnan(ranges), axis=1)
+
+    active = np.flatnonzero(num_valid > 0)
+    y = y0[active].copy()
+
+    # Ranges at or before the starting position
+    while active.size:
+        target = ranges[active, np.minimum(pending[active], num_ranges - 1)]
+        hit = (pending[active] < num_valid[active]) & (y[:, 0] >= target)
+        if not hit.any():
+            break
+        shots = active[hit]
+        t_out[shots, pending[shots]] = 0.0
+        y_out[shots, pending[shots]] = y[hit]
+        pending[shots] += 1
+
+    f = fun(y, active)
+    t = 0.0
+    while active.size and t < t_max:
+        k2 = fun(y + 0.5 * h * f, active)
+        k3 = fun(y + 0.5 * h * k2, active)
+        k4 = fun(y + h * k3, active)
+        y_new = y + h / 6.0 * (f + 2.0 * k2 + 2.0 * k3 + k4)
+        f_new = fun(y_new, active)
+
+        # A single step can pass several ranges
+        while True:
+            done = pending[active] >= num_valid[active]
+            target = ranges[active, np.minimum(pending[active], num_ranges - 1)]
+            hit = ~done & (y_new[:, 0] >= target)
+            if not hit.any():
+                break
+
+            s = _hermite_root(
+                y[hit, 0], y_new[hit, 0], h * f[hit, 0], h * f_new[hit, 0],
+                target[hit])
+            shots = active[hit]
+            t_out[shots, pending[shots]] = t + s * h
+            y_out[shots, pending[shots]] = _hermite(
+                y[hit], y_new[hit], h * f[hit], h * f_new[hit], s)
+            pending[shots] += 1
+
+        t += h
+        y = y_new
+        f = f_new
+
+        keep = pending[active] < num_valid[active]
+        if not keep.all():
+            active = active[keep]
+            y = y[keep]
+            f = f[keep]
+
+    return t_out, y_out
+
+
+def calculate_trajectories(
+    traj,
+    x0: np.ndarray,
+    v0: np.ndarray,
+    bc,
+    ranges: np.ndarray,
+    wind: np.ndarray = np.zeros(3),
+    temp=59.0,
+    pressure=29.92,
+    rh=0.0,
+    h: float = DEFAULT_BATCH_STEP,
+    workers: int = 1,
+    executor=None
+) -> (np.ndarray, np.ndarray):
+    """Calculates many trajectories at once with vectorized fixed-step
+    integration. This is the batched counterpart of
+    `PointMassTrajectory.calculate_trajectory` with range events.
+
+    With more than one worker the shots are split into chunks integrated on
+    a thread pool. Each thread works on whole arrays of shots, so the time is
+    spent in NumPy array operations, the drag included through
+    `PointMassTrajectory.drag_curve`, and the drag model is shared instead of
+    being copied to other processes.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model providing the drag function
+    x0 : np.ndarray
+        Initial positions in ft, shape (N, 3) or (3,)
+    v0 : np.ndarray
+        Initial velocities in ft/s, shape (N, 3)
+    bc : float or np.ndarray
+        Ballistic coefficients in lb/in2, shared or shape (N,)
+    ranges : np.ndarray
+        Increasing downrange distances in ft, shape (R,) or (N, R)
+    wind : np.ndarray
+        Wind velocities in ft/s, shape (N, 3) or (3,)
+    temp, pressure, rh : float or np.ndarray
+        Atmospheric conditions, shared or one per shot
+    h : float
+        Time step in s
+    workers : int
+        Number of chunks the shots are split into, each holding at least
+        `MIN_SHOTS_PER_THREAD` shots
+    executor : concurrent.futures.Executor
+        Thread pool to run the chunks on, e.g. one shared by the host
+        application. A pool with `workers` threads is created if not given.
+
+    Returns
+    -------
+    t : np.ndarray
+        Time of flight to each range, shape (N, R)
+    y : np.ndarray
+        State (x, y, z, vx, vy, vz) at each range, shape (N, R, 6)
+    """
+
+    v0 = np.atleast_2d(np.asarray(v0, dtype=float))
+    num_shots = v0.shape[0]
+    x0 = np.broadcast_to(np.asarray(x0, dtype=float), (num_shots, 3))
+    bc = np.broadcast_to(np.asarray(bc, dtype=float), (num_shots,))
+    wind = np.broadcast_to(np.asarray(wind, dtype=float), (num_shots, 3))
+    density_air, v_sound = atmosphere(temp, pressure, rh, num_shots)
+
+    y0 = np.concatenate((x0, v0), axis=1)
+    ranges = np.broadcast_to(
+        np.asarray(ranges, dtype=float), (num_shots, np.shape(ranges)[-1]))
+
+    def integrate_chunk(shots: np.ndarray):
+        def fun(y: np.ndarray, index: np.ndarray):
+            index = shots[index]
+            accel = batch_acceleration(
+                traj, y[:, 3:], v_sound[index], bc[index], density_air[index],
+                wind[index])
+            return np.concatenate((y[:, 3:], accel), axis=1)
+
+        return integrate_to_ranges(fun, y0[shots], ranges[shots], h)
+
+    return map_shot_chunks(integrate_chunk, num_shots, workers, executor)
+
+
+def map_shot_chunks(func, num_shots: int, workers: int = 1, executor=None):
+    """Splits a batch of shots into contiguous chunks, runs `func` on each
+    on a thread pool and concatenates the results along the first axis.
+
+    Parameters
+    ----------
+    func : callable
+        `func(shots)` takes the indices of the shots of a chunk and returns
+        a tuple of arrays with one row per shot
+    num_shots : int
+        Number of shots in the batch
+    workers : int
+        Number of chunks, each holding at least `MIN_SHOTS_PER_THREAD` shots
+    executor : concurrent.futures.Executor
+        Pool to run the chunks on. A pool with one thread per chunk is
+        created if not given.
+
+    Returns
+    -------
+    results : tuple
+        Results of all chunks concatenated
+    """
+
+    num_chunks = int(min(workers, np.ceil(num_shots / MIN_SHOTS_PER_THREAD)))
+    if num_chunks <= 1:
+        return func(np.arange(num_shots))
+
+    chunks = np.array_split(np.arange(num_shots), num_chunks)
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=num_chunks) as pool:
+            results = list(pool.map(func, chunks))
+    else:
+        results = list(executor.map(func, chunks))
+
+    return tuple(np.concatenate(parts) for parts in zip(*results))
@@ -0,0 +1,339 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .environment import air_density, speed_sound
+from .integration import CUSTOM_ODE_SOLVERS
+
+CALIBRATION_VERSION = 2
+
+# Maximum position error in ft that `method='auto'` is allowed to incur
+DEFAULT_ACCURACY = 1e-2
+
+# Scenarios the methods are benchmarked on: muzzle Mach numbers, BCs in
+# lb/in2 in the standard atmosphere, and the ranges (ft) at which the error
+# against the reference is measured. Outside of them the reference method is
+# used.
+CALIBRATION_MACHS = (0.8, 1.5, 2.5, 3.5)
+CALIBRATION_BCS = (0.15, 0.3, 0.6, 1.2)
+CALIBRATION_RANGES = (300.0, 1500.0, 3000.0, 6000.0)
+
+# Air density in lb/ft3 of the calibration scenarios
+STANDARD_AIR_DENSITY = air_density(59.0, 29.92, 0.0, 0.0)
+
+SCIPY_ODE_SOLVERS = ('RK23', 'RK45', 'DOP853', 'Radau', 'BDF', 'LSODA')
+SCIPY_TOLERANCES = (1e-3, 1e-5, 1e-7, 1e-9)
+CUSTOM_STEP_SIZES = (1.0 / 60.0, 1.0 / 120.0, 1.0 / 240.0, 1.0 / 480.0)
+
+REFERENCE_METHOD = ('DOP853', {'rtol': 1e-12, 'atol': 1e-12})
+
+
+def default_cache_dir() -> str:
+    """Returns the directory where calibrations are stored. Can be overridden
+    with the BALLISTICS_CACHE_DIR environment variable.
+    """
+
+    cache_dir = os.environ.get('BALLISTICS_CACHE_DIR')
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.path.expanduser('~'), '.cache', 'ballistics')
+    return cache_dir
+
+
+def default_candidates() -> list[(str, dict)]:
+    """Lists every (method, options) pair that is benchmarked by default.
+
+    Returns
+    -------
+    candidates : list
+        Each entry of CUSTOM_ODE_SOLVERS at every step size in
+        CUSTOM_STEP_SIZES, followed by the scipy methods at every tolerance in
+        SCIPY_TOLERANCES
+    """
+
+    candidates = []
+    for name in CUSTOM_ODE_SOLVERS:
+        for h in CUSTOM_STEP_SIZES:
+            candidates.append((name, {'h': h}))
+    for name in SCIPY_ODE_SOLVERS:
+        for tol in SCIPY_TOLERANCES:
+            candidates.append((name, {'rtol': tol, 'atol': tol}))
+    return candidates
+
+
+def effective_bc(bc: float, density_air: float) -> float:
+    """BC in lb/in2 that gives the same drag in the standard atmosphere as
+    `bc` does at the air density in lb/ft3. The drag deceleration only depends
+    on the ratio of the two, so this is the BC axis of the calibration.
+    """
+    return bc * STANDARD_AIR_DENSITY / density_air
+
+
+def calibration_digest(
+    table: list[(float, float)],
+    machs,
+    bcs,
+    ranges,
+    candidates
+) -> str:
+    """Hashes a drag table together with the benchmark settings so that a
+    cached calibration is only reused for the exact same inputs.
+    """
+
+    key = repr((
+        CALIBRATION_VERSION,
+        [tuple(map(float, row)) for row in table],
+        [float(m) for m in machs],
+        [float(b) for b in bcs],
+        [float(r) for r in ranges],
+        [(name, sorted(options.items())) for name, options in candidates]
+    ))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def benchmark_methods(
+    traj,
+    machs=CALIBRATION_MACHS,
+    bcs=CALIBRATION_BCS,
+    ranges=CALIBRATION_RANGES,
+    candidates=None
+) -> dict:
+    """Measures the error and cost of each candidate method against a
+    high-accuracy reference solution.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model whose drag table is being calibrated
+    machs : sequence of float
+        Muzzle Mach numbers of the benchmark scenarios
+    bcs : sequence of float
+        BCs in lb/in2 of the benchmark scenarios, each one flown at every
+        Mach number
+    ranges : sequence of float
+        Ranges in ft at which the position error is measured
+    candidates : list of (str, dict), optional
+        Methods and solver options to benchmark. Defaults to
+        default_candidates()
+
+    Returns
+    -------
+    calibration : dict
+        The benchmark settings and, per candidate, the number of RHS
+        evaluations and the wall time in s of each scenario, indexed by Mach
+        number then BC, and the position error in ft at each range of each
+        scenario
+    """
+
+    if candidates is None:
+        candidates = default_candidates()
+
+    # Standard atmosphere, flat fire
+    v_sound = speed_sound(59.0, 0.0, 0.0)
+    x0 = np.zeros(3)
+
+    def run(mach, bc, method, options):
+        v0 = np.array([mach * v_sound, 0.0, 0.0])
+        start = time.perf_counter()
+        result = traj.calculate_trajectory(
+            x0, v0, bc, method=method, ranges=ranges, **options)
+        elapsed = time.perf_counter() - start
+
+        positions = np.full((len(ranges), 3), np.nan)
+        for i, y in enumerate(result.y_events):
+            if y.size:
+                positions[i] = y[0, :3]
+        return positions, result.nfev, elapsed
+
+    scenarios = [(mach, bc) for mach in machs for bc in bcs]
+    reference = [run(mach, bc, *REFERENCE_METHOD)[0] for mach, bc in scenarios]
+
+    shape = (len(machs), len(bcs))
+    entries = []
+    for method, options in candidates:
+        nfev = []
+        times = []
+        errors = []
+        for (mach, bc), ref in zip(scenarios, reference):
+            try:
+                positions, n, elapsed = run(mach, bc, method, options)
+            except Exception:
+                positions, n, elapsed = np.full_like(ref, np.nan), 0, 0.0
+
+            error = np.linalg.norm(positions - ref, axis=1)
+            error[~np.isfinite(error)] = np.inf
+            # Ranges that even the reference does not reach are not scored
+            error[np.isnan(ref).any(axis=1)] = 0.0
+
+            nfev.append(int(n))
+            times.append(elapsed)
+            errors.append(error)
+
+        nfev = np.reshape(nfev, shape)
+        times = np.reshape(times, shape)
+        errors = np.reshape(errors, shape + (len(ranges),))
+
+        entries.append({
+            'method': method,
+            'options': options,
+            'nfev': nfev.tolist(),
+            'time': times.tolist(),
+            'errors': errors.tolist()
+        })
+
+    return {
+        'version': CALIBRATION_VERSION,
+        'machs': list(machs),
+        'bcs': list(bcs),
+        'ranges': list(ranges),
+        'candidates': entries
+    }
+
+
+def load_calibration(
+    traj,
+    machs=CALIBRATION_MACHS,
+    bcs=CALIBRATION_BCS,
+    ranges=CALIBRATION_RANGES,
+    candidates=None,
+    cache_dir: str = None
+) -> dict:
+    """Loads the calibration of the trajectory's drag table from the disk
+    cache, benchmarking the methods and saving the result if it is missing.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model whose drag table is being calibrated
+    machs, bcs, ranges, candidates
+        See benchmark_methods
+    cache_dir : str, optional
+        Directory of the cache. Defaults to default_cache_dir()
+
+    Returns
+    -------
+    calibration : dict
+        See benchmark_methods
+    """
+
+    if candidates is None:
+        candidates = default_candidates()
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+
+    digest = calibration_digest(traj.table, machs, bcs, ranges, candidates)
+    path = os.path.join(cache_dir, f'{digest}.json')
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    calibration = benchmark_methods(traj, machs, bcs, ranges, candidates)
+
+    # Write to a temporary file first so that concurrent readers never see a
+    # partially written calibration
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(calibration, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+    return calibration
+
+
+def select_method(
+    calibration: dict,
+    mach: float,
+    bc: float,
+    max_range: float = None,
+    accuracy: float = DEFAULT_ACCURACY
+) -> (str, dict):
+    """Picks the cheapest calibrated method that meets the accuracy on every
+    calibrated scenario bracketing the trajectory.
+
+    Accuracy is only known within the calibrated scenarios. For a muzzle
+    Mach number, BC or range outside of them REFERENCE_METHOD is returned.
+
+    Parameters
+    ----------
+    calibration : dict
+        Result of benchmark_methods or load_calibration
+    mach : float
+        Muzzle Mach number of the trajectory
+    bc : float
+        BC in lb/in2 in the standard atmosphere, see effective_bc
+    max_range : float, optional
+        Farthest range in ft of interest. Defaults to the farthest calibrated
+        range
+    accuracy : float
+        Maximum position error in ft
+
+    Returns
+    -------
+    method : str
+        Name of the method
+    options : dict
+        Solver options (tolerances or step size) to use with the method
+    """
+
+    reference = REFERENCE_METHOD[0], dict(REFERENCE_METHOD[1])
+
+    ranges = np.asarray(calibration['ranges'])
+    if max_range is None:
+        num_ranges = len(ranges)
+    elif max_range > ranges[-1]:
+        return reference
+    else:
+        num_ranges = int(np.searchsorted(ranges, max_range)) + 1
+
+    mach_scenarios = _bracket(calibration['machs'], mach)
+    bc_scenarios = _bracket(calibration['bcs'], bc)
+    if mach_scenarios is None or bc_scenarios is None:
+        return reference
+    scenarios = np.ix_(mach_scenarios, bc_scenarios)
+
+    best = None
+    best_key = None
+    for entry in calibration['candidates']:
+        errors = np.asarray(entry['errors'], dtype=float)
+        error = errors[scenarios][..., :num_ranges].max()
+        cost = np.asarray(entry['nfev'])[scenarios].sum()
+
+        # Any candidate that meets the accuracy beats the ones that do not
+        if error <= accuracy:
+            key = (0, cost, error)
+        else:
+            key = (1, error, cost)
+
+        if best_key is None or key < best_key:
+            best = entry
+            best_key = key
+
+    if best is None:
+        return reference
+
+    return best['method'], dict(best['options'])
+
+
+def _bracket(points, value: float):
+    # Indices of the calibrated points on either side of the value, None if
+    # it is outside of them
+    points = np.asarray(points, dtype=float)
+    order = np.argsort(points)
+    sorted_points = points[order]
+    if not sorted_points[0] <= value <= sorted_points[-1]:
+        return None
+
+    i = int(np.searchsorted(sorted_points, value))
+    if sorted_points[i] == value:
+        return order[i:i + 1]
+    return order[i - 1:i + 1]
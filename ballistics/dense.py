@@ -0,0 +1,188 @@
+import numpy as np
+
+# Degree of the polynomial kept per step. DOP853 interpolates with degree 7,
+# the other methods with less, so their dense output is kept exactly.
+DENSE_OUTPUT_DEGREE = 7
+
+# Newton iterations when solving for the time at a range within a step
+RANGE_NEWTON_ITERATIONS = 3
+
+GRAINS_PER_POUND = 7000.0
+LBM_PER_SLUG = 32.17405
+
+
+class DenseTrajectory:
+    """Trajectory that can be queried at any time or range without being
+    integrated again. The dense output of every step of the solver is stored
+    as the coefficients of a polynomial in the normalized time within the
+    step, so a batch of queries is a binary search over the step boundaries
+    followed by vectorized polynomial evaluation.
+
+    The downrange distance is assumed to increase with time.
+
+    Parameters
+    ----------
+    t_bounds : np.ndarray
+        Times in s of the step boundaries, shape (n + 1,)
+    coefficients : np.ndarray
+        Polynomial coefficients of the state (x, y, z, vx, vy, vz) of each
+        step, lowest degree first, shape (n, degree + 1, 6)
+    """
+
+    def __init__(self, t_bounds: np.ndarray, coefficients: np.ndarray) -> None:
+        self.t_bounds = np.asarray(t_bounds, dtype=float)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.h = np.diff(self.t_bounds)
+
+        # Downrange distance at the start of each step and at the very end
+        self.x_bounds = np.append(
+            self.coefficients[:, 0, 0], self.coefficients[-1, :, 0].sum())
+
+        # Same coefficients grouped by degree and state component, so that
+        # the queries run along the contiguous last axis
+        self._by_degree = np.ascontiguousarray(
+            self.coefficients.transpose(1, 2, 0))
+        self._x_by_degree = np.ascontiguousarray(self._by_degree[:, 0, :])
+
+        # Derivative of the downrange distance with respect to the
+        # normalized time, for the Newton iterations
+        degree = self.coefficients.shape[1] - 1
+        self._dx_by_degree = \
+            self._x_by_degree[1:] * np.arange(1, degree + 1)[:, None]
+
+    @classmethod
+    def from_solution(cls, sol, degree: int = DENSE_OUTPUT_DEGREE):
+        """Builds the trajectory from the `sol` of a solve_ivp result (an
+        OdeSolution) by fitting each step at Chebyshev-Lobatto nodes.
+        """
+
+        t_bounds = np.asarray(sol.ts, dtype=float)
+        # Drop steps of zero length, e.g. from restarts on wind zones
+        t_bounds = t_bounds[np.append(True, np.diff(t_bounds) > 0.0)]
+        h = np.diff(t_bounds)
+
+        nodes = 0.5 - 0.5 * np.cos(np.pi * np.arange(degree + 1) / degree)
+        # Keep the samples off the boundaries so each one is taken from its
+        # own step
+        inset = np.clip(nodes, 1e-9, 1.0 - 1e-9)
+        t = t_bounds[:-1, None] + h[:, None] * inset
+        values = sol(t.ravel()).T.reshape(h.size, degree + 1, -1)
+
+        vandermonde = inset[:, None] ** np.arange(degree + 1)
+        coefficients = np.linalg.solve(
+            vandermonde, values.transpose(1, 0, 2).reshape(degree + 1, -1))
+        coefficients = coefficients.reshape(degree + 1, h.size, -1)
+        return cls(t_bounds, coefficients.transpose(1, 0, 2))
+
+    @property
+    def t_start(self) -> float:
+        return self.t_bounds[0]
+
+    @property
+    def t_end(self) -> float:
+        return self.t_bounds[-1]
+
+    @property
+    def x_start(self) -> float:
+        return self.x_bounds[0]
+
+    @property
+    def x_end(self) -> float:
+        return self.x_bounds[-1]
+
+    def _evaluate(self, step: np.ndarray, s: np.ndarray) -> np.ndarray:
+        # Horner's method on every query at once
+        c = self._by_degree
+        y = np.take(c[-1], step, axis=1)
+        for k in range(c.shape[0] - 2, -1, -1):
+            y *= s
+            y += np.take(c[k], step, axis=1)
+        return y.T
+
+    def _step_at_time(self, t: np.ndarray) -> np.ndarray:
+        return np.clip(np.searchsorted(self.t_bounds, t, 'right') - 1,
+                       0, self.h.size - 1)
+
+    def at_time(self, t) -> np.ndarray:
+        """State (x, y, z, vx, vy, vz) at the times in s, shape (..., 6). NaN
+        outside of the trajectory.
+        """
+
+        t = np.asarray(t, dtype=float)
+        shape = t.shape
+        t = t.ravel()
+
+        step = self._step_at_time(t)
+        s = (t - self.t_bounds[step]) / self.h[step]
+        y = self._evaluate(step, s)
+
+        y[(t < self.t_start) | (t > self.t_end)] = np.nan
+        return y.reshape(shape + (6,))
+
+    def at_range(self, x) -> (np.ndarray, np.ndarray):
+        """Time of flight in s and state (x, y, z, vx, vy, vz) at the
+        downrange distances in ft, shapes (...) and (..., 6). NaN outside of
+        the trajectory.
+        """
+
+        x = np.asarray(x, dtype=float)
+        shape = x.shape
+        x = x.ravel()
+
+        step = np.clip(np.searchsorted(self.x_bounds, x, 'right') - 1,
+                       0, self.h.size - 1)
+        x0 = self.x_bounds[step]
+        x1 = self.x_bounds[step + 1]
+        width = np.where(x1 > x0, x1 - x0, 1.0)
+        s = np.clip((x - x0) / width, 0.0, 1.0)
+
+        c = np.take(self._x_by_degree, step, axis=1)
+        dc = np.take(self._dx_by_degree, step, axis=1)
+        for _ in range(RANGE_NEWTON_ITERATIONS):
+            value = c[-1]
+            for k in range(c.shape[0] - 2, -1, -1):
+                value = value * s + c[k]
+            slope = dc[-1]
+            for k in range(dc.shape[0] - 2, -1, -1):
+                slope = slope * s + dc[k]
+            s = np.clip(s - (value - x) / slope, 0.0, 1.0)
+
+        t = self.t_bounds[step] + s * self.h[step]
+        y = self._evaluate(step, s)
+
+        # Allow for the rounding of the fitted polynomials at the ends
+        tol = 1e-9 * np.maximum(1.0, np.abs(self.x_bounds[[0, -1]]))
+        outside = (x < self.x_start - tol[0]) | (x > self.x_end + tol[1])
+        t[outside] = np.nan
+        y[outside] = np.nan
+        return t.reshape(shape), y.reshape(shape + (6,))
+
+    def time_of_flight(self, x) -> np.ndarray:
+        """Time of flight in s to the downrange distances in ft."""
+        return self.at_range(x)[0]
+
+    def speed_at_range(self, x) -> np.ndarray:
+        """Speed in ft/s at the downrange distances in ft."""
+        return np.linalg.norm(self.at_range(x)[1][..., 3:], axis=-1)
+
+    def speed_at_time(self, t) -> np.ndarray:
+        """Speed in ft/s at the times in s."""
+        return np.linalg.norm(self.at_time(t)[..., 3:], axis=-1)
+
+    def energy_at_range(self, x, weight: float) -> np.ndarray:
+        """Kinetic energy in ft-lbf at the downrange distances in ft of a
+        projectile weighing `weight` grains.
+        """
+
+        return _kinetic_energy(self.speed_at_range(x), weight)
+
+    def energy_at_time(self, t, weight: float) -> np.ndarray:
+        """Kinetic energy in ft-lbf at the times in s of a projectile weighing
+        `weight` grains.
+        """
+
+        return _kinetic_energy(self.speed_at_time(t), weight)
+
+
+def _kinetic_energy(speed: np.ndarray, weight: float) -> np.ndarray:
+    return weight / GRAINS_PER_POUND * speed**2 / (2.0 * LBM_PER_SLUG)
@@ -0,0 +1,475 @@
+import numpy as np
+
+from .batch import DEFAULT_BATCH_STEP, atmosphere, integrate_to_ranges
+from .trajectory import ACCEL_GRAVITY
+
+# Default standard deviations of the measurements, used to weight them
+DEFAULT_SIGMA = {
+    'speed': 1.0,        # ft/s
+    'drop': 1.0 / 12.0,  # ft
+    'tof': 1e-3          # s
+}
+
+MAX_FIT_ITERATIONS = 30
+FIT_TOLERANCE = 1e-8
+
+
+def hat_basis(mach: np.ndarray, knots: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Evaluates the piecewise linear "hat" functions centered on each knot,
+    held constant beyond the first and last knot.
+
+    Parameters
+    ----------
+    mach : np.ndarray
+        Mach numbers, shape (n,)
+    knots : np.ndarray
+        Increasing Mach numbers of the knots, shape (K,)
+
+    Returns
+    -------
+    phi : np.ndarray
+        Value of each basis function, shape (n, K)
+    dphi : np.ndarray
+        Derivative of each basis function with respect to Mach, shape (n, K)
+    """
+
+    mach = np.asarray(mach, dtype=float)
+    knots = np.asarray(knots, dtype=float)
+    rows = np.arange(mach.size)
+
+    i = np.clip(np.searchsorted(knots, mach) - 1, 0, knots.size - 2)
+    width = knots[i + 1] - knots[i]
+    w = (mach - knots[i]) / width
+    inside = (w >= 0.0) & (w <= 1.0)
+    w = np.clip(w, 0.0, 1.0)
+    dw = np.where(inside, 1.0 / width, 0.0)
+
+    phi = np.zeros((mach.size, knots.size))
+    dphi = np.zeros((mach.size, knots.size))
+    phi[rows, i] = 1.0 - w
+    phi[rows, i + 1] = w
+    dphi[rows, i] = -dw
+    dphi[rows, i + 1] = dw
+    return phi, dphi
+
+
+def apply_form_factor(
+    table: list[(float, float)],
+    knots: np.ndarray,
+    coefficients: np.ndarray
+) -> list[(float, float)]:
+    """Scales a drag table by the fitted form factor
+    `1 + sum(c_j * phi_j(M))`. The result can be passed to PointMassTrajectory.
+    """
+
+    mach, cd = map(np.asarray, zip(*table))
+    phi, _ = hat_basis(mach, knots)
+    cd = cd * (1.0 + phi @ np.asarray(coefficients, dtype=float))
+    return list(zip(mach.tolist(), cd.tolist()))
+
+
+class _SensitivityProblem:
+    """Integrates a batch of shots together with the derivatives of their
+    states with respect to the drag parameters (forward sensitivities), then
+    maps them to the measurements.
+
+    The drag of shot n is scaled by `u[n] * (1 + sum(c_j * phi_j(M)))`, where
+    `u = 1 / bc`. The parameters are either `u` (one per shot, P = 1) or the
+    form factor coefficients `c` (shared, P = K).
+    """
+
+    def __init__(
+        self,
+        traj,
+        x0,
+        v0,
+        ranges,
+        observations,
+        sigma,
+        wind,
+        temp,
+        pressure,
+        rh,
+        knots,
+        h
+    ):
+        self.traj = traj
+
+        self.v0 = np.atleast_2d(np.asarray(v0, dtype=float))
+        num_shots = self.v0.shape[0]
+        self.x0 = np.broadcast_to(np.asarray(x0, dtype=float), (num_shots, 3))
+        self.wind = np.broadcast_to(np.asarray(wind, dtype=float), (num_shots, 3))
+        self.ranges = np.broadcast_to(
+            np.asarray(ranges, dtype=float), (num_shots, np.shape(ranges)[-1]))
+        self.density_air, self.v_sound = atmosphere(
+            temp, pressure, rh, num_shots)
+        self.knots = None if knots is None else np.asarray(knots, dtype=float)
+        self.h = h
+
+        sigma = {**DEFAULT_SIGMA, **(sigma or {})}
+        self.observations = {}
+        for kind, values in observations.items():
+            if kind not in DEFAULT_SIGMA:
+                raise Exception(f'Unknown kind of measurement: {kind}')
+            values = np.broadcast_to(
+                np.asarray(values, dtype=float), self.ranges.shape)
+            self.observations[kind] = (values, sigma[kind])
+
+        if not self.observations:
+            raise Exception('No measurements to fit')
+
+    @property
+    def num_shots(self) -> int:
+        return self.v0.shape[0]
+
+    def residuals(self, index, u, c, fit_bc):
+        """Returns the weighted residuals and their Jacobian with respect to
+        `u` (if `fit_bc`) or `c`, with shapes (n, M) and (n, M, P). Missing
+        measurements have zero residual and gradient.
+        """
+
+        num_params = 1 if fit_bc else c.size
+        n = index.size
+
+        u = u[index]
+        v_sound = self.v_sound[index]
+        density_air = self.density_air[index]
+        wind = self.wind[index]
+        k = density_air * np.pi / 1152.0
+
+        def fun(y: np.ndarray, active: np.ndarray):
+            # `active` indexes into the `index` subset
+            v = y[:, 3:6]
+            vw = v - wind[active]
+            speed = np.sqrt(np.einsum('ij,ij->i', vw, vw))
+            vs = v_sound[active]
+            mach = speed / vs
+
+            cd = self.traj.drag_curve(mach)
+            dcd = self.traj.drag_curve.derivative(mach)
+            if self.knots is None:
+                drag = cd
+                ddrag = dcd
+            else:
+                phi, dphi = hat_basis(mach, self.knots)
+                form_factor = 1.0 + phi @ c
+                drag = cd * form_factor
+                ddrag = dcd * form_factor + cd * (dphi @ c)
+
+            scale = k[active] * u[active]
+            accel = -(scale * drag * speed)[:, None] * vw + ACCEL_GRAVITY
+
+            # Sensitivities S = dy/dp, stored row-major as (6, P)
+            sens = y[:, 6:].reshape(-1, 6, num_params)
+            sens_v = sens[:, 3:, :]
+
+            # (da/dv) @ S_v without forming the 3x3 Jacobians
+            proj = np.einsum('ni,nip->np', vw, sens_v)
+            coef = drag / speed + ddrag / vs
+            d_sens_v = -scale[:, None, None] * (
+                (drag * speed)[:, None, None] * sens_v +
+                vw[:, :, None] * (coef[:, None] * proj)[:, None, :]
+            )
+
+            if fit_bc:
+                d_sens_v[:, :, 0] -= (k[active] * drag * speed)[:, None] * vw
+            else:
+                d_sens_v -= ((scale * cd * speed)[:, None, None] *
+                             vw[:, :, None] * phi[:, None, :])
+
+            d_sens = np.concatenate((sens_v, d_sens_v), axis=1)
+            return np.concatenate(
+                (v, accel, d_sens.reshape(-1, 6 * num_params)), axis=1)
+
+        y0 = np.concatenate(
+            (self.x0[index], self.v0[index], np.zeros((n, 6 * num_params))),
+            axis=1)
+        t, y = integrate_to_ranges(fun, y0, self.ranges[index], self.h)
+
+        # Re-evaluate the derivatives at the ranges, needed since the
+        # measurements are taken at a fixed distance instead of a fixed time
+        num_ranges = self.ranges.shape[1]
+        flat = np.nan_to_num(y.reshape(n * num_ranges, -1), nan=1.0)
+        dy = fun(flat, np.repeat(np.arange(n), num_ranges))
+        dy = dy[:, :6].reshape(n, num_ranges, 6)
+        sens = y[:, :, 6:].reshape(n, num_ranges, 6, num_params)
+
+        # Moving the crossing time: dq/dp = S_q - (dq/dt) / vx * S_x
+        dt_dp = -sens[:, :, 0, :] / y[:, :, 3, None]
+
+        residuals = []
+        jacobians = []
+        for kind, (values, sigma) in self.observations.items():
+            values = values[index]
+            if kind == 'speed':
+                v = y[:, :, 3:6]
+                speed = np.linalg.norm(v, axis=2)
+                model = speed
+                dq_dt = np.einsum('nri,nri->nr', v, dy[:, :, 3:6]) / speed
+                dq_dp = np.einsum('nri,nrip->nrp', v, sens[:, :, 3:6, :]) / \
+                    speed[:, :, None]
+            elif kind == 'drop':
+                model = y[:, :, 2]
+                dq_dt = y[:, :, 5]
+                dq_dp = sens[:, :, 2, :]
+            else:
+                model = t
+                dq_dt = np.ones_like(t)
+                dq_dp = np.zeros_like(dt_dp)
+
+            dq_dp = dq_dp + dq_dt[:, :, None] * dt_dp
+            r = (model - values) / sigma
+            jac = dq_dp / sigma
+
+            missing = np.isnan(r) | np.isnan(jac).any(axis=2)
+            r[missing] = 0.0
+            jac[missing] = 0.0
+            residuals.append(r)
+            jacobians.append(jac)
+
+        return np.concatenate(residuals, axis=1), \
+            np.concatenate(jacobians, axis=1)
+
+
+def fit_bc(
+    traj,
+    x0: np.ndarray,
+    v0: np.ndarray,
+    ranges: np.ndarray,
+    observations: dict,
+    bc0=0.5,
+    per_shot: bool = False,
+    sigma: dict = None,
+    wind: np.ndarray = np.zeros(3),
+    temp=59.0,
+    pressure=29.92,
+    rh=0.0,
+    h: float = DEFAULT_BATCH_STEP,
+    full_output: bool = False
+):
+    """Estimates the ballistic coefficient from measurements of many shots.
+
+    All shots are integrated together along with the sensitivities of their
+    states to the drag, which give the exact gradient of the measurements
+    with respect to 1/BC. The BC is then found with Levenberg-Marquardt.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model providing the drag table
+    x0 : np.ndarray
+        Initial positions in ft, shape (N, 3) or (3,)
+    v0 : np.ndarray
+        Initial velocities in ft/s, shape (N, 3)
+    ranges : np.ndarray
+        Increasing distances in ft of the measurements, shape (R,) or (N, R).
+        Rows can be padded at the end with NaN.
+    observations : dict
+        Measurements at the ranges keyed by kind, shape (R,) or (N, R). NaN
+        marks a missing value. The kinds are 'speed' (ft/s, e.g. chronograph
+        or Doppler radar), 'drop' (height in ft) and 'tof' (time of flight in
+        s).
+    bc0 : float or np.ndarray
+        Initial guess of the BC in lb/in2
+    per_shot : bool
+        Fit a separate BC for each shot instead of a single shared one
+    sigma : dict, optional
+        Standard deviation of each kind of measurement, used as weights.
+        Defaults to DEFAULT_SIGMA.
+    wind : np.ndarray
+        Wind velocities in ft/s, shape (N, 3) or (3,)
+    temp, pressure, rh : float or np.ndarray
+        Atmospheric conditions, shared or one per shot
+    h : float
+        Integration time step in s
+    full_output : bool
+        Also return whether each fit converged and its final cost instead of
+        raising when one does not
+
+    Returns
+    -------
+    bc : float or np.ndarray
+        The fitted BC, or one per shot if `per_shot`
+    converged : bool or np.ndarray
+        Whether the fit converged, or one per shot if `per_shot`. Only
+        returned if `full_output`.
+    cost : float or np.ndarray
+        Final weighted sum of squared residuals, or one per shot if
+        `per_shot`. Only returned if `full_output`.
+    """
+
+    problem = _SensitivityProblem(
+        traj, x0, v0, ranges, observations, sigma, wind, temp, pressure, rh,
+        None, h)
+    num_shots = problem.num_shots
+    u = 1.0 / np.broadcast_to(np.asarray(bc0, dtype=float), (num_shots,))
+    u = u.copy()
+
+    # Groups of shots that share a BC, solved independently of each other
+    if per_shot:
+        groups = np.arange(num_shots)
+    else:
+        groups = np.zeros(num_shots, dtype=int)
+    num_groups = groups.max() + 1
+
+    def evaluate(index, u):
+        r, jac = problem.residuals(index, u, None, True)
+        cost = np.bincount(groups[index], (r * r).sum(axis=1), num_groups)
+        grad = np.bincount(
+            groups[index], (jac[:, :, 0] * r).sum(axis=1), num_groups)
+        hess = np.bincount(
+            groups[index], (jac[:, :, 0] ** 2).sum(axis=1), num_groups)
+        return cost, grad, hess
+
+    damping = np.full(num_groups, 1e-3)
+    converged = np.zeros(num_groups, dtype=bool)
+    failed = np.zeros(num_groups, dtype=bool)
+    index = np.arange(num_shots)
+    cost, grad, hess = evaluate(index, u)
+
+    for _ in range(MAX_FIT_ITERATIONS):
+        done = converged | failed
+        if done.all():
+            break
+
+        # Only integrate the shots whose BC is still changing
+        index = np.flatnonzero(~done[groups])
+        g = groups[index]
+        ok = hess > 0.0
+        step = np.where(ok, -grad / np.where(ok, hess * (1.0 + damping), 1.0), 0.0)
+        u_old = u.copy()
+        u_new = u.copy()
+        # Keep 1/BC positive
+        u_new[index] = np.maximum(u[index] + step[g], 0.5 * u[index])
+        proposed = np.zeros(num_groups)
+        np.maximum.at(proposed, g, np.abs(u_new[index] - u[index]) / u[index])
+
+        cost_new, grad_new, hess_new = evaluate(index, u_new)
+        better = (cost_new <= cost) & ~done
+        improved = better[groups]
+        u[improved] = u_new[improved]
+        cost = np.where(better, cost_new, cost)
+        grad = np.where(better, grad_new, grad)
+        hess = np.where(better, hess_new, hess)
+        damping = np.where(better, damping * 0.1, damping * 10.0)
+
+        change = np.zeros(num_groups)
+        np.maximum.at(change, groups, np.abs(u - u_old) / u)
+        # A rejected step that is already below the tolerance means the
+        # minimum is reached within rounding
+        converged |= ~done & ok & (
+            (better & (change < FIT_TOLERANCE)) | (proposed < FIT_TOLERANCE))
+        failed |= ~done & ~converged & (~ok | (damping > 1e10))
+
+    if not full_output and not converged.all():
+        raise Exception('BC fit failed to converge')
+
+    bc = 1.0 / u
+    if not per_shot:
+        bc, converged, cost = float(bc[0]), bool(converged[0]), float(cost[0])
+    if full_output:
+        return bc, converged, cost
+    return bc
+
+
+def fit_form_factor(
+    traj,
+    x0: np.ndarray,
+    v0: np.ndarray,
+    bc,
+    ranges: np.ndarray,
+    observations: dict,
+    knots: np.ndarray,
+    regularization: float = 0.0,
+    sigma: dict = None,
+    wind: np.ndarray = np.zeros(3),
+    temp=59.0,
+    pressure=29.92,
+    rh=0.0,
+    h: float = DEFAULT_BATCH_STEP,
+    full_output: bool = False
+) -> np.ndarray:
+    """Estimates a Mach dependent correction of the drag table from
+    measurements of many shots. The drag coefficient is scaled by
+    `1 + sum(c_j * phi_j(M))` where `phi_j` are the hat functions of
+    `hat_basis`, so `1 + c_j` is the form factor at the j-th knot.
+
+    Since a constant form factor is indistinguishable from a change in BC,
+    the BC of the shots must be known.
+
+    Parameters
+    ----------
+    traj : PointMassTrajectory
+        Trajectory model providing the drag table
+    x0, v0, ranges, observations, sigma, wind, temp, pressure, rh, h
+        See fit_bc
+    bc : float or np.ndarray
+        Ballistic coefficients in lb/in2, shared or shape (N,)
+    knots : np.ndarray
+        Increasing Mach numbers where the correction is defined
+    regularization : float
+        Weight of the penalty on the size of the coefficients
+    full_output : bool
+        Also return whether the fit converged and its final cost instead of
+        raising when it does not
+
+    Returns
+    -------
+    coefficients : np.ndarray
+        The correction `c_j` at each knot. Use apply_form_factor to get the
+        corrected drag table.
+    converged : bool
+        Whether the fit converged. Only returned if `full_output`.
+    cost : float
+        Final weighted sum of squared residuals plus the penalty. Only
+        returned if `full_output`.
+    """
+
+    problem = _SensitivityProblem(
+        traj, x0, v0, ranges, observations, sigma, wind, temp, pressure, rh,
+        knots, h)
+    index = np.arange(problem.num_shots)
+    u = 1.0 / np.broadcast_to(np.asarray(bc, dtype=float), (index.size,))
+    num_params = problem.knots.size
+
+    def evaluate(c):
+        r, jac = problem.residuals(index, u, c, False)
+        r = r.reshape(-1)
+        jac = jac.reshape(-1, num_params)
+        cost = r @ r + regularization * c @ c
+        grad = jac.T @ r + regularization * c
+        hess = jac.T @ jac + regularization * np.eye(num_params)
+        return cost, grad, hess
+
+    c = np.zeros(num_params)
+    cost, grad, hess = evaluate(c)
+    damping = 1e-3
+    converged = False
+
+    for _ in range(MAX_FIT_ITERATIONS):
+        lhs = hess + damping * np.diag(np.diag(hess) + 1e-12)
+        step = -np.linalg.lstsq(lhs, grad, rcond=None)[0]
+        c_new = c + step
+        # A rejected step that is already below the tolerance means the
+        # minimum is reached within rounding
+        small = np.max(np.abs(step)) < \
+            FIT_TOLERANCE * max(1.0, np.max(np.abs(c_new)))
+
+        cost_new, grad_new, hess_new = evaluate(c_new)
+        if cost_new <= cost:
+            c, cost, grad, hess = c_new, cost_new, grad_new, hess_new
+            damping *= 0.1
+        else:
+            damping *= 10.0
+
+        if small:
+            converged = True
+            break
+        if damping > 1e10:
+            break
+
+    if full_output:
+        return c, converged, float(cost)
+    if not converged:
+        raise Exception('Form factor fit failed to converge')
+    return c
@@ -0,0 +1,427 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from .batch import calculate_trajectories
+from .calibration import CUSTOM_STEP_SIZES, REFERENCE_METHOD, default_candidates
+from .trajectory import PointMassTrajectory, parse_drag_table
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+REFERENCE_DIR = os.path.join(DATA_DIR, 'reference')
+FRONTIER_PATH = os.path.join(REFERENCE_DIR, 'frontier.json')
+
+MPH_TO_FPS = 5280.0 / 3600.0
+
+# Smallest values the deviations from a reference table are relative to, so
+# that near zero entries do not dominate
+TABLE_ERROR_FLOORS = {'drop': 1.0, 'windage': 1.0, 'speed': 1.0, 'time': 0.01}
+
+# Allowed drift from the stored frontier, for rounding differences between
+# platforms and library versions
+FRONTIER_ERROR_SLACK = 2.0
+FRONTIER_ERROR_FLOOR = 1e-8
+FRONTIER_NFEV_SLACK = 1.1
+
+AUTO_ACCURACIES = (1e-1, 1e-2, 1e-4)
+
+
+def load_scenarios(directory: str = REFERENCE_DIR) -> list[dict]:
+    """Loads the reference scenarios stored as JSON files in the directory.
+
+    Each file holds the drag table file name within the data directory, the
+    muzzle speed in ft/s, the BC in lb/in2, the sight height in inches, the
+    wind in mph, the atmosphere (temp, pressure, rh), optionally the zero
+    range in yards, and the published table as `columns` and `rows`. The
+    columns are the range in yards followed by any of drop and windage in
+    inches, speed in ft/s and time of flight in s. `resolution` gives the
+    rounding of each column and `tolerance` the relative deviation from the
+    table that the model is expected to stay within.
+    """
+
+    scenarios = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        if os.path.abspath(path) == os.path.abspath(FRONTIER_PATH):
+            continue
+        with open(path) as f:
+            scenario = json.load(f)
+        scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+        scenarios.append(scenario)
+    return scenarios
+
+
+def default_modes(auto: bool = True) -> list[(str, dict)]:
+    """Lists every solver and speed/accuracy mode that the harness runs: the
+    calibration candidates, the batched integrator at each step size and
+    optionally `method='auto'` at a few accuracies in ft.
+    """
+
+    modes = default_candidates()
+    modes += [('batch', {'h': h}) for h in CUSTOM_STEP_SIZES]
+    if auto:
+        modes += [('auto', {'accuracy': a}) for a in AUTO_ACCURACIES]
+    return modes
+
+
+def mode_name(method: str, options: dict) -> str:
+    options = ', '.join(f'{k}={v:g}' for k, v in sorted(options.items()))
+    return f'{method}({options})'
+
+
+class PreparedScenario:
+    """Scenario with its launch state and high-accuracy reference solution,
+    shared by every mode run on it.
+    """
+
+    def __init__(self, scenario: dict, traj: PointMassTrajectory) -> None:
+        self.scenario = scenario
+        self.traj = traj
+        self.bc = scenario['bc']
+        self.wind = MPH_TO_FPS * np.asarray(scenario['wind'], dtype=float)
+        self.atmosphere = dict(
+            temp=scenario['temp'],
+            pressure=scenario['pressure'],
+            rh=scenario['rh']
+        )
+
+        rows = np.asarray(scenario['rows'], dtype=float)
+        self.columns = scenario['columns']
+        self.table = rows
+        self.ranges = 3.0 * rows[:, 0]
+
+        self.x0 = np.array([0.0, 0.0, -scenario['sight_height'] / 12.0])
+        speed = scenario['muzzle_speed']
+        if 'zero_range' in scenario:
+            method, options = REFERENCE_METHOD
+            ver_angle, hor_angle = traj.solve_for_initial_velocity(
+                self.x0, speed, self.bc, 3.0 * scenario['zero_range'], 0.0,
+                wind=self.wind, method=method, **self.atmosphere, **options)
+        else:
+            ver_angle, hor_angle = 0.0, 0.0
+        self.v0 = speed * np.array([
+            np.cos(ver_angle) * np.cos(hor_angle),
+            np.sin(hor_angle),
+            np.sin(ver_angle) * np.cos(hor_angle)
+        ])
+
+        _, self.reference, _, _ = self.run(*REFERENCE_METHOD)
+
+    def run(
+        self,
+        method: str,
+        options: dict
+    ) -> (np.ndarray, np.ndarray, int, float):
+        """Returns the times of flight and states at the ranges of the
+        table, the number of RHS evaluations and the wall time in s of the
+        mode.
+        """
+
+        start = time.perf_counter()
+        if method == 'batch':
+            t, y = calculate_trajectories(
+                self.traj, self.x0, self.v0, self.bc, self.ranges,
+                wind=self.wind, **self.atmosphere, **options)
+            elapsed = time.perf_counter() - start
+            # Four evaluations per step plus the initial one
+            steps = np.ceil(np.nanmax(t) / options['h'])
+            return t[0], y[0], int(4 * steps + 1), elapsed
+
+        result = self.traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=self.wind, method=method,
+            ranges=list(self.ranges), **self.atmosphere, **options)
+        elapsed = time.perf_counter() - start
+
+        t = np.full(self.ranges.size, np.nan)
+        states = np.full((self.ranges.size, 6), np.nan)
+        for i, (t_event, y) in enumerate(zip(result.t_events, result.y_events)):
+            if y.size:
+                t[i] = t_event[0]
+                states[i] = y[0]
+        return t, states, int(result.nfev), elapsed
+
+    def table_error(self, t: np.ndarray, states: np.ndarray) -> float:
+        """Largest deviation from the published table beyond its rounding,
+        relative to the magnitude of each entry.
+        """
+
+        values = {
+            'drop': 12.0 * states[:, 2],
+            'windage': 12.0 * states[:, 1],
+            'speed': np.linalg.norm(states[:, 3:], axis=1),
+            'time': t
+        }
+        resolution = self.scenario.get('resolution', {})
+        error = 0.0
+        for k, column in enumerate(self.columns[1:], start=1):
+            ref = self.table[:, k]
+            deviation = np.abs(values[column] - ref) - \
+                0.5 * resolution.get(column, 0.0)
+            scale = np.maximum(np.abs(ref), TABLE_ERROR_FLOORS[column])
+            error = max(error, np.max(np.maximum(deviation, 0.0) / scale))
+        return error
+
+
+def run_harness(
+    scenarios: list[dict] = None,
+    modes: list[(str, dict)] = None,
+    workers: int = None,
+    repeat: int = 1,
+    calibration_options: dict = None
+) -> list[dict]:
+    """Runs every mode on every scenario on a thread pool for the errors and
+    the numbers of RHS evaluations, then once more one case at a time for the
+    wall times.
+
+    Parameters
+    ----------
+    scenarios : list of dict, optional
+        Reference scenarios, defaults to load_scenarios()
+    modes : list of (str, dict), optional
+        Methods and options to run, defaults to default_modes()
+    workers : int, optional
+        Number of threads, defaults to the number of CPUs
+    repeat : int
+        Number of timed runs per case, the fastest one is reported
+    calibration_options : dict, optional
+        Keyword arguments of `PointMassTrajectory.calibrate` for the modes
+        with `method='auto'`
+
+    Returns
+    -------
+    results : list of dict
+        Per mode and scenario, the position error in ft against the
+        reference solution, the relative deviation from the published table,
+        the number of RHS evaluations and the wall time in s
+    """
+
+    if scenarios is None:
+        scenarios = load_scenarios()
+    if modes is None:
+        modes = default_modes()
+
+    # One model per drag table, shared by all threads
+    models = {}
+    for scenario in scenarios:
+        name = scenario['drag_table']
+        if name not in models:
+            models[name] = PointMassTrajectory(
+                parse_drag_table(os.path.join(DATA_DIR, name)))
+
+    # Calibrate up front so that it is not timed as part of the first case
+    if any(method == 'auto' for method, _ in modes):
+        for traj in models.values():
+            traj.calibrate(**(calibration_options or {}))
+
+    def prepare(scenario):
+        return PreparedScenario(scenario, models[scenario['drag_table']])
+
+    def run(case):
+        prepared, (method, options) = case
+        try:
+            t, states, nfev, _ = prepared.run(method, options)
+        except Exception:
+            t = np.full(prepared.ranges.size, np.nan)
+            states = np.full((prepared.ranges.size, 6), np.nan)
+            nfev = 0
+
+        error = np.linalg.norm(states[:, :3] - prepared.reference[:, :3], axis=1)
+        error[~np.isfinite(error)] = np.inf
+        return {
+            'scenario': prepared.scenario['name'],
+            'method': method,
+            'options': options,
+            'error': float(np.max(error)),
+            'table_error': float(prepared.table_error(t, states)),
+            'nfev': nfev,
+            'time': 0.0
+        }
+
+    def time_case(case):
+        prepared, (method, options) = case
+        return min(prepared.run(method, options)[3] for _ in range(repeat))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        prepared = list(pool.map(prepare, scenarios))
+        cases = [(p, mode) for mode in modes for p in prepared]
+        results = list(pool.map(run, cases))
+
+    # Cases running side by side slow each other down, so the wall time is
+    # measured in a serial pass
+    for case, result in zip(cases, results):
+        if result['nfev']:
+            result['time'] = time_case(case)
+    return results
+
+
+def pareto_table(results: list[dict]) -> list[dict]:
+    """Aggregates the results per mode and marks the modes on the Pareto
+    frontier of error against wall time and against RHS evaluations.
+
+    Returns
+    -------
+    rows : list of dict
+        Per mode, the largest errors and the total cost over all scenarios,
+        sorted by increasing error
+    """
+
+    rows = {}
+    for result in results:
+        key = mode_name(result['method'], result['options'])
+        row = rows.setdefault(key, {
+            'mode': key,
+            'method': result['method'],
+            'options': result['options'],
+            'error': 0.0,
+            'table_error': 0.0,
+            'nfev': 0,
+            'time': 0.0
+        })
+        row['error'] = max(row['error'], result['error'])
+        row['table_error'] = max(row['table_error'], result['table_error'])
+        row['nfev'] += result['nfev']
+        row['time'] += result['time']
+
+    rows = sorted(rows.values(), key=lambda row: (row['error'], row['time']))
+    for row in rows:
+        for cost in ('time', 'nfev'):
+            row[f'pareto_{cost}'] = not any(
+                _dominates(other, row, cost) for other in rows)
+    return rows
+
+
+def _dominates(a: dict, b: dict, cost: str) -> bool:
+    return (a['error'] <= b['error'] and a[cost] <= b[cost] and
+            (a['error'] < b['error'] or a[cost] < b[cost]))
+
+
+def format_table(rows: list[dict]) -> str:
+    """Formats the rows of pareto_table as text. The frontier column marks
+    the modes that no other is both more accurate and faster (T) or cheaper
+    in RHS evaluations (N) than.
+    """
+
+    lines = [f'{"mode":<36} {"error ft":>10} {"table":>8} {"nfev":>8} '
+             f'{"time ms":>9}  frontier']
+    for row in rows:
+        frontier = ('T' if row['pareto_time'] else ' ') + \
+            ('N' if row['pareto_nfev'] else ' ')
+        lines.append(
+            f'{row["mode"]:<36} {row["error"]:>10.2e} '
+            f'{row["table_error"]:>8.1e} {row["nfev"]:>8d} '
+            f'{1e3 * row["time"]:>9.2f}  {frontier}')
+    return '\n'.join(lines)
+
+
+def save_frontier(rows: list[dict], path: str = FRONTIER_PATH) -> None:
+    """Stores the error and RHS evaluations of each mode as the frontier that
+    later runs are checked against. `method='auto'` depends on a
+    machine-specific calibration and is left out, it is checked against its
+    own accuracy instead.
+    """
+
+    frontier = {
+        row['mode']: {'error': row['error'], 'nfev': row['nfev'],
+                      'pareto': row['pareto_nfev']}
+        for row in rows if row['method'] != 'auto'
+    }
+    with open(path, 'w') as f:
+        json.dump(frontier, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def load_frontier(path: str = FRONTIER_PATH) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_frontier(rows: list[dict], frontier: dict) -> list[str]:
+    """Checks the rows of pareto_table against the stored frontier.
+
+    A mode that is already stored must not lose accuracy or need more RHS
+    evaluations. A new mode must not be dominated by a stored mode on the
+    frontier, i.e. it has to stay on or above the current accuracy frontier.
+    Wall time depends on the machine, so only RHS evaluations are compared.
+    `method='auto'` has to meet the accuracy it is asked for.
+
+    Returns
+    -------
+    failures : list of str
+        Description of each mode that fails, empty if all pass
+    """
+
+    failures = []
+    for row in rows:
+        if row['method'] == 'auto':
+            accuracy = row['options']['accuracy']
+            if not row['error'] <= FRONTIER_ERROR_SLACK * accuracy:
+                failures.append(
+                    f'{row["mode"]}: error {row["error"]:.3e} ft above the '
+                    f'requested accuracy')
+            continue
+
+        stored = frontier.get(row['mode'])
+        if stored is not None:
+            max_error = FRONTIER_ERROR_SLACK * stored['error'] + FRONTIER_ERROR_FLOOR
+            if not row['error'] <= max_error:
+                failures.append(
+                    f'{row["mode"]}: error {row["error"]:.3e} ft above '
+                    f'stored {stored["error"]:.3e} ft')
+            if row['nfev'] > FRONTIER_NFEV_SLACK * stored['nfev']:
+                failures.append(
+                    f'{row["mode"]}: {row["nfev"]} RHS evaluations above '
+                    f'stored {stored["nfev"]}')
+            continue
+
+        for name, point in frontier.items():
+            if not point['pareto']:
+                continue
+            if (point['nfev'] <= row['nfev'] and
+                    FRONTIER_ERROR_SLACK * point['error'] + FRONTIER_ERROR_FLOOR
+                    < row['error']):
+                failures.append(
+                    f'{row["mode"]}: dominated by {name} with error '
+                    f'{point["error"]:.3e} ft in {point["nfev"]} evaluations')
+                break
+
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Accuracy and performance of every solver mode on the '
+                    'reference scenarios')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of threads, defaults to the CPU count')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per case, the fastest is reported')
+    parser.add_argument('--no-auto', action='store_true',
+                        help="skip method='auto', which may need calibrating")
+    parser.add_argument('--update-frontier', action='store_true',
+                        help='store the results as the new frontier')
+    args = parser.parse_args(argv)
+
+    results = run_harness(
+        modes=default_modes(auto=not args.no_auto),
+        workers=args.workers,
+        repeat=args.repeat
+    )
+    rows = pareto_table(results)
+    print(format_table(rows))
+
+    if args.update_frontier:
+        save_frontier(rows)
+        return 0
+
+    failures = check_frontier(rows, load_frontier())
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
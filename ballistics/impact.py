@@ -0,0 +1,219 @@
+import numpy as np
+from numpy.polynomial import polynomial
+from scipy.optimize import brentq
+from scipy.special import comb
+
+from .wind import BreakpointIndex
+
+IMPACT_TIME_TOLERANCE = 1e-12
+
+# Distance in ft to a surface counted as touching it, so that an event that
+# stopped the integration on the surface is found again at the last step
+IMPACT_DISTANCE_TOLERANCE = 1e-9
+
+
+class TerrainProfile:
+    """Ground elevation along the range, linear between the given points and
+    held constant beyond the first and last one.
+
+    Can be passed to `calculate_trajectory` as a terminal event. Impacts are
+    where the projectile descends through the ground from above, so a muzzle
+    starting below the ground level does not count.
+
+    Parameters
+    ----------
+    ranges : array_like
+        Increasing downrange distances in ft
+    heights : array_like
+        Ground elevation in ft at each range
+    """
+
+    terminal = True
+    direction = -1.0
+
+    def __init__(self, ranges, heights) -> None:
+        self.index = BreakpointIndex(ranges)
+        self.ranges = self.index.points
+        self.heights = np.asarray(heights, dtype=float)
+        if self.heights.shape != self.ranges.shape:
+            raise Exception('Expecting one height per range')
+
+        widths = np.diff(self.ranges)
+        self.slopes = np.append(np.diff(self.heights) / widths, 0.0)
+
+    def height(self, x):
+        """Ground elevation in ft at the downrange distances in ft."""
+
+        i = self.index.index(x)
+        dx = np.clip(x - self.ranges[i], 0.0, None)
+        return self.heights[i] + self.slopes[i] * dx
+
+    def __call__(self, t: float, y: np.ndarray) -> float:
+        return y[2] - self.height(y[0])
+
+    def crossing(self, trajectory) -> float:
+        """Time in s of the first impact along a DenseTrajectory, NaN if
+        there is none.
+
+        The clearance is sampled at the step boundaries and at the terrain
+        points within the range flown, found through the breakpoint index.
+        Between two samples the ground is a straight line and the trajectory
+        curves downwards, so a sign change between samples finds every
+        impact. It is then refined on the step's dense output.
+        """
+
+        inside = (self.ranges > trajectory.x_start) & \
+            (self.ranges < trajectory.x_end)
+        t_vertices = trajectory.time_of_flight(self.ranges[inside])
+        t = np.union1d(trajectory.t_bounds, t_vertices)
+        t = t[np.isfinite(t)]
+
+        y = trajectory.at_time(t)
+        clearance = y[:, 2] - self.height(y[:, 0])
+
+        return _first_crossing(trajectory, self._clearance_at, t, clearance)
+
+    def _clearance_at(self, trajectory, t: float) -> float:
+        y = trajectory.at_time(t)
+        return y[2] - self.height(y[0])
+
+
+class TargetPlane:
+    """Plane through `point` with normal `normal`, e.g. an inclined target
+    or a slope. An impact is the first time the projectile passes through it
+    from the side it starts on.
+
+    Can be passed to `calculate_trajectory` as a terminal event.
+    """
+
+    terminal = True
+    direction = 0.0
+
+    def __init__(self, point, normal) -> None:
+        self.point = np.asarray(point, dtype=float)
+        normal = np.asarray(normal, dtype=float)
+        self.normal = normal / np.linalg.norm(normal)
+
+    @classmethod
+    def at_range(
+        cls,
+        distance: float,
+        elevation: float = 0.0,
+        inclination: float = 0.0
+    ):
+        """Vertical target at the downrange distance and elevation in ft,
+        tilted back by `inclination` radians.
+        """
+
+        point = np.array([distance, 0.0, elevation])
+        normal = np.array([np.cos(inclination), 0.0, np.sin(inclination)])
+        return cls(point, normal)
+
+    def __call__(self, t: float, y: np.ndarray) -> float:
+        return self.normal @ (y[:3] - self.point)
+
+    def crossing(self, trajectory) -> float:
+        """Time in s of the first impact along a DenseTrajectory, NaN if
+        there is none.
+
+        The distance to the plane is a polynomial within each step. It is
+        sampled at the step boundaries, and also at its extrema in the steps
+        where it is not bounded away from the plane by its coefficients in
+        the Bernstein basis, so that passing through the plane and back
+        within one step (e.g. near the apex) is not missed. Sign changes
+        between samples are then refined on the step's dense output.
+        """
+
+        # Distance to the plane as polynomials in the normalized time
+        c = trajectory.coefficients[:, :, :3] @ self.normal
+        c[:, 0] -= self.normal @ self.point
+
+        # Flip so that the starting side is positive
+        distance = np.append(c[:, 0], c[-1].sum())
+        nonzero = np.flatnonzero(distance)
+        side = -1.0 if nonzero.size and distance[nonzero[0]] < 0.0 else 1.0
+        c *= side
+        distance *= side
+
+        # Steps up to the first crossing seen at the boundaries that start
+        # and end on the positive side but may dip down in between
+        positive = distance > IMPACT_DISTANCE_TOLERANCE
+        crossed = np.flatnonzero(positive[:-1] & ~positive[1:])
+        end = crossed[0] if crossed.size else c.shape[0]
+        bernstein = c[:end] @ _bernstein_matrix(c.shape[1] - 1).T
+        steps = np.flatnonzero(
+            positive[:end] & positive[1:end + 1] &
+            (bernstein.min(axis=1) <= IMPACT_DISTANCE_TOLERANCE))
+
+        t = [trajectory.t_bounds]
+        for i in steps:
+            s = _roots_in_step(polynomial.polyder(c[i]))
+            t.append(trajectory.t_bounds[i] + s * trajectory.h[i])
+        t = np.unique(np.concatenate(t))
+
+        def distance_at(trajectory, t: float) -> float:
+            return side * ((trajectory.at_time(t)[..., :3] - self.point) @ self.normal)
+
+        return _first_crossing(trajectory, distance_at, t, distance_at(trajectory, t))
+
+
+def _bernstein_matrix(degree: int) -> np.ndarray:
+    # Maps power basis coefficients on [0, 1] to Bernstein coefficients,
+    # which bound the polynomial from below and above on the interval
+    i = np.arange(degree + 1)
+    return np.tril(comb(i[:, None], i) / comb(degree, i))
+
+
+def _roots_in_step(c: np.ndarray) -> np.ndarray:
+    # Real roots within (0, 1) of a polynomial with coefficients lowest
+    # degree first, ignoring leading coefficients that are only rounding
+    c = polynomial.polytrim(c, 1e-14 * np.max(np.abs(c), initial=0.0))
+    if c.size < 2:
+        return np.empty(0)
+    roots = polynomial.polyroots(c)
+    roots = roots.real[np.abs(roots.imag) < 1e-9]
+    return roots[(roots > 0.0) & (roots < 1.0)]
+
+
+def _first_crossing(trajectory, fun, t, values) -> float:
+    # First sign change from positive to non-positive after being positive
+    positive = values > IMPACT_DISTANCE_TOLERANCE
+    seen = np.maximum.accumulate(positive)
+    crossed = np.flatnonzero(seen[:-1] & positive[:-1] & ~positive[1:])
+    if not crossed.size:
+        return np.nan
+
+    i = crossed[0]
+    if values[i + 1] >= 0.0:
+        return t[i + 1]
+    return brentq(lambda t: fun(trajectory, t), t[i], t[i + 1],
+                  xtol=IMPACT_TIME_TOLERANCE)
+
+
+def find_impact(trajectory, surfaces) -> (int, float, np.ndarray):
+    """Finds the earliest impact on any of the surfaces along a
+    DenseTrajectory.
+
+    Parameters
+    ----------
+    trajectory : DenseTrajectory
+        Trajectory to search
+    surfaces : list
+        TerrainProfile and TargetPlane instances
+
+    Returns
+    -------
+    index : int
+        Index of the surface that is hit, -1 if none
+    t : float
+        Time of flight in s to the impact
+    y : np.ndarray
+        State (x, y, z, vx, vy, vz) at the impact
+    """
+
+    times = np.array([surface.crossing(trajectory) for surface in surfaces])
+    if np.isnan(times).all():
+        return -1, np.nan, np.full(6, np.nan)
+
+    index = int(np.nanargmin(times))
+    return index, times[index], trajectory.at_time(times[index])
@@ -35,7 +35,8 @@ class CustomOdeSolver(OdeSolver):
         return True, None
 
     def _dense_output_impl(self):
-        return SplineDenseOutput(self.t_old, self.t, self.hist)
+        # Copy the history since the deque keeps changing on later steps
+        return SplineDenseOutput(self.t_old, self.t, list(self.hist))
 
 
 class EulerMethod(CustomOdeSolver):
@@ -48,7 +49,7 @@ class EulerMethod(CustomOdeSolver):
             t_new = self.t_bound
         h = t_new - self.t
 
-        self.y += self.fun(self.t, self.y) * h
+        self.y = self.y + self.fun(self.t, self.y) * h
         self.t = t_new
 
         return super()._step_impl()
@@ -66,7 +67,7 @@ class TwoStepAdamsBashforth(CustomOdeSolver):
         h = t_new - self.t
 
         derivative = self.fun(self.t, self.y)
-        self.y += (3.0 * derivative - self.derivative_old) / 2.0 * h
+        self.y = self.y + (3.0 * derivative - self.derivative_old) / 2.0 * h
         self.t = t_new
         self.derivative_old = derivative
 
@@ -87,7 +88,7 @@ class HeunsMethod(CustomOdeSolver):
         y_pred = self.y + derivative * h
         derivative_pred = self.fun(t_new, y_pred)
 
-        self.y += (derivative + derivative_pred) / 2.0 * h
+        self.y = self.y + (derivative + derivative_pred) / 2.0 * h
         self.t = t_new
 
         return super()._step_impl()
@@ -137,7 +138,16 @@ class RungeKuttaMethod(CustomOdeSolver):
         k3 = self.fun(self.t + h / 2.0, self.y + k2 * h / 2.0)
         k4 = self.fun(self.t + h, self.y + k3 * h)
 
-        self.y += (k1 + 2.0 * k2 + 2.0 * k3 + k4) / 6.0 * h
+        self.y = self.y + (k1 + 2.0 * k2 + 2.0 * k3 + k4) / 6.0 * h
         self.t = t_new
 
         return super()._step_impl()
+
+
+CUSTOM_ODE_SOLVERS = {
+    'EulerMethod': EulerMethod,
+    'TwoStepAdamsBashforth': TwoStepAdamsBashforth,
+    'HeunsMethod': HeunsMethod,
+    'BeemansAlgorithm': BeemansAlgorithm,
+    'RungeKuttaMethod': RungeKuttaMethod
+}
@@ -0,0 +1,102 @@
+from ballistics.trajectory import *
+from ballistics.batch import *
+
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+import numpy as np
+
+
+class TestBatchTrajectory(unittest.TestCase):
+    def test_matches_single_trajectory(self):
+        pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg1.txt'))
+        sight_height = 1.5 / 12.0
+        wind = 10 * 5280 / 3600 * np.array([0.0, 1.0, 0.0])
+        ranges = [3.0 * x for x in range(0, 2100, 100)]
+
+        angles = np.radians(np.linspace(0.0, 0.5, 5))
+        speeds = np.linspace(2600.0, 3000.0, 5)
+        bcs = np.linspace(0.3, 0.5, 5)
+        x0 = np.array([0.0, 0.0, -sight_height])
+        v0 = speeds[:, None] * np.stack(
+            (np.cos(angles), np.zeros_like(angles), np.sin(angles)), axis=1)
+
+        t, y = calculate_trajectories(
+            pm_traj, x0, v0, bcs, ranges, wind=wind, temp=70.0, rh=50.0)
+
+        for i in range(len(speeds)):
+            result = pm_traj.calculate_trajectory(
+                x0, v0[i], bcs[i], wind=wind, temp=70.0, rh=50.0,
+                method='DOP853', ranges=ranges, rtol=1e-10, atol=1e-10)
+
+            for j, (t_ref, y_ref) in enumerate(zip(result.t_events, result.y_events)):
+                self.assertAlmostEqual(t[i, j], t_ref[0], places=6)
+                np.testing.assert_allclose(y[i, j], y_ref[0], atol=1e-4)
+
+    def test_padded_ranges(self):
+        pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg7.txt'))
+        v0 = np.array([[2800.0, 0.0, 0.0], [2800.0, 0.0, 0.0]])
+        ranges = np.array([[300.0, 600.0, 900.0], [300.0, np.nan, np.nan]])
+
+        t, y = calculate_trajectories(pm_traj, np.zeros(3), v0, 0.3, ranges)
+
+        np.testing.assert_allclose(y[:, 0, 0], [300.0, 300.0])
+        np.testing.assert_allclose(y[0, :, 0], [300.0, 600.0, 900.0])
+        self.assertTrue(np.isnan(t[1, 1:]).all())
+        self.assertTrue(np.isnan(y[1, 1:]).all())
+
+    def test_drag_curve(self):
+        for name in ['mcg1', 'mcg7', 'mccoy_chapter6_g7']:
+            pm_traj = PointMassTrajectory(
+                parse_drag_table(f'ballistics/data/{name}.txt'))
+
+            # Knots, between them and extrapolated past the table
+            knots = np.unique(pm_traj.cd_func.t)
+            mach = np.concatenate((
+                knots, 0.5 * (knots[1:] + knots[:-1]),
+                np.linspace(knots[0] - 0.5, knots[-1] + 0.5, 1001)))
+            np.testing.assert_allclose(
+                pm_traj.drag_curve(mach), pm_traj.cd_func(mach),
+                rtol=1e-12, atol=1e-12)
+            np.testing.assert_allclose(
+                pm_traj.drag_curve.derivative(mach),
+                pm_traj.cd_func.derivative()(mach), rtol=1e-12, atol=1e-12)
+            self.assertAlmostEqual(
+                pm_traj.drag_curve(2.0), float(pm_traj.cd_func(2.0)), places=12)
+
+            v = np.array([[2800.0, 10.0, -50.0], [900.0, 0.0, 0.0]])
+            wind = np.array([0.0, 15.0, 0.0])
+            accel = batch_acceleration(
+                pm_traj, v, np.full(2, 1116.0), np.full(2, 0.3),
+                np.full(2, 0.0764), wind)
+            for i in range(2):
+                np.testing.assert_allclose(
+                    accel[i], pm_traj.calculate_acceleration(
+                        v[i], 1116.0, 0.3, 0.0764, wind), rtol=1e-12)
+
+    def test_thread_pool(self):
+        pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg1.txt'))
+        num_shots = 300
+        angles = np.radians(np.linspace(0.0, 1.0, num_shots))
+        v0 = 2800.0 * np.stack(
+            (np.cos(angles), np.zeros_like(angles), np.sin(angles)), axis=1)
+        bcs = np.linspace(0.2, 0.6, num_shots)
+        ranges = np.linspace(300.0, 3000.0, 10)
+        # Different numbers of ranges per shot
+        ranges = np.where(
+            np.arange(10) < 5 + np.arange(num_shots)[:, None] % 6, ranges, np.nan)
+
+        t, y = calculate_trajectories(pm_traj, np.zeros(3), v0, bcs, ranges)
+        t_threads, y_threads = calculate_trajectories(
+            pm_traj, np.zeros(3), v0, bcs, ranges, workers=4)
+        np.testing.assert_allclose(t_threads, t, rtol=1e-12)
+        np.testing.assert_allclose(y_threads, y, rtol=1e-12)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            t_pool, y_pool = calculate_trajectories(
+                pm_traj, np.zeros(3), v0, bcs, ranges, workers=3, executor=pool)
+        np.testing.assert_allclose(t_pool, t, rtol=1e-12)
+        np.testing.assert_allclose(y_pool, y, rtol=1e-12)
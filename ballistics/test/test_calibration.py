@@ -0,0 +1,117 @@
+from ballistics.trajectory import *
+from ballistics.calibration import *
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg7.txt'))
+        self.machs = (1.5, 2.5)
+        self.bcs = (0.2, 0.4)
+        self.ranges = (300.0, 1500.0)
+        self.candidates = [
+            ('EulerMethod', {'h': 1.0 / 60.0}),
+            ('RungeKuttaMethod', {'h': 1.0 / 60.0}),
+            ('RK45', {'rtol': 1e-3, 'atol': 1e-3}),
+            ('DOP853', {'rtol': 1e-9, 'atol': 1e-9})
+        ]
+
+    def test_calibration_is_cached_per_drag_table(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            kwargs = dict(
+                machs=self.machs,
+                bcs=self.bcs,
+                ranges=self.ranges,
+                candidates=self.candidates,
+                cache_dir=cache_dir
+            )
+            calibration = load_calibration(self.pm_traj, **kwargs)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertEqual(calibration, load_calibration(self.pm_traj, **kwargs))
+
+            other_traj = PointMassTrajectory(
+                parse_drag_table('ballistics/data/mcg1.txt'))
+            load_calibration(other_traj, **kwargs)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_selection_meets_accuracy(self):
+        calibration = benchmark_methods(
+            self.pm_traj, self.machs, self.bcs, self.ranges, self.candidates)
+
+        for accuracy in (1.0, 1e-2, 1e-6):
+            method, options = select_method(calibration, 2.0, 0.3, 1500.0, accuracy)
+            entry = next(e for e in calibration['candidates']
+                         if e['method'] == method and e['options'] == options)
+            self.assertLessEqual(np.max(entry['errors']), accuracy)
+
+        # The cheapest method wins when every candidate is accurate enough
+        method, _ = select_method(calibration, 2.0, 0.3, 1500.0, 10.0)
+        self.assertEqual(method, 'RK45')
+
+        # Falls back to the most accurate method when none qualifies
+        method, _ = select_method(calibration, 2.0, 0.3, 1500.0, 0.0)
+        self.assertIn(method, ('RungeKuttaMethod', 'DOP853'))
+
+        # The error of the BCs on both sides is taken into account
+        entry = next(e for e in calibration['candidates'] if e['method'] == 'RK45')
+        errors = np.asarray(entry['errors'])[:, :, :2].max(axis=(0, 2))
+        accuracy = np.sqrt(errors[0] * errors[1])
+        method, _ = select_method(
+            calibration, 2.0, self.bcs[np.argmin(errors)], 1500.0, accuracy)
+        self.assertEqual(method, 'RK45')
+        method, _ = select_method(calibration, 2.0, 0.3, 1500.0, accuracy)
+        self.assertNotEqual(method, 'RK45')
+
+        # Accuracy is unknown outside of the calibrated scenarios
+        for mach, bc, max_range in ((1.0, 0.3, 1500.0), (4.0, 0.3, 1500.0),
+                                    (2.0, 0.1, 1500.0), (2.0, 0.5, 1500.0),
+                                    (2.0, 0.3, 2000.0)):
+            self.assertEqual(
+                select_method(calibration, mach, bc, max_range, 10.0),
+                REFERENCE_METHOD)
+
+    def test_auto_method(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.pm_traj.calibrate(
+                machs=self.machs,
+                bcs=self.bcs,
+                ranges=self.ranges,
+                candidates=self.candidates,
+                cache_dir=cache_dir
+            )
+
+        x0 = np.zeros(3)
+        v0 = np.array([2800.0, 0.0, 0.0])
+        bc = 0.3
+        ranges = [300.0, 900.0, 1500.0]
+        accuracy = 1e-3
+
+        expected = self.pm_traj.calculate_trajectory(
+            x0, v0, bc, method='DOP853', ranges=ranges, rtol=1e-12, atol=1e-12)
+        result = self.pm_traj.calculate_trajectory(
+            x0, v0, bc, method='auto', ranges=ranges, accuracy=accuracy)
+
+        for y, y_ref in zip(result.y_events, expected.y_events):
+            error = np.linalg.norm(y[0, :3] - y_ref[0, :3])
+            self.assertLess(error, accuracy)
+
+        ver_angle, hor_angle = self.pm_traj.solve_for_initial_velocity(
+            x0, 2800.0, bc, 1500.0, 0.0, method='auto')
+        ver_angle_ref, hor_angle_ref = self.pm_traj.solve_for_initial_velocity(
+            x0, 2800.0, bc, 1500.0, 0.0, method='DOP853')
+        self.assertAlmostEqual(ver_angle, ver_angle_ref, places=6)
+        self.assertAlmostEqual(hor_angle, hor_angle_ref, places=6)
+
+        # Without ranges the farthest range is unknown
+        v0 = np.array([2200.0, 0.0, 30.0])
+        result = self.pm_traj.calculate_trajectory(
+            x0, v0, bc, method='auto', accuracy=accuracy)
+        expected = self.pm_traj.calculate_trajectory(
+            x0, v0, bc, method=REFERENCE_METHOD[0], **REFERENCE_METHOD[1])
+        np.testing.assert_array_equal(result.y, expected.y)
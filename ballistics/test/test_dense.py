@@ -0,0 +1,82 @@
+from ballistics.trajectory import *
+from ballistics.dense import *
+
+import unittest
+
+import numpy as np
+
+
+class TestDenseTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg1.txt'))
+        self.x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        self.v0 = np.array([3000.0, 0.0, 0.0])
+        self.bc = 0.5
+        self.wind = 10 * 5280 / 3600 * np.array([0.0, 1.0, 0.0])
+        self.ranges = [3.0 * x for x in range(100, 2100, 100)]
+
+    def test_matches_events(self):
+        for method in ('DOP853', 'RK45', 'LSODA', 'RungeKuttaMethod'):
+            result = self.pm_traj.calculate_trajectory(
+                self.x0, self.v0, self.bc, wind=self.wind, method=method,
+                ranges=self.ranges, dense_trajectory=True)
+            trajectory = result.trajectory
+
+            t, y = trajectory.at_range(self.ranges)
+            for i, (t_ref, y_ref) in enumerate(zip(result.t_events, result.y_events)):
+                self.assertAlmostEqual(t[i], t_ref[0], places=9)
+                np.testing.assert_allclose(y[i], y_ref[0], rtol=1e-9, atol=1e-9)
+
+            times = np.linspace(0.0, trajectory.t_end, 50)
+            np.testing.assert_allclose(
+                trajectory.at_time(times), result.sol(times).T, rtol=1e-8, atol=1e-8)
+
+    def test_queries(self):
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, method='DOP853', ranges=self.ranges,
+            dense_trajectory=True, rtol=1e-10, atol=1e-10)
+        trajectory = result.trajectory
+
+        # JBM Ballistics result, see test_trajectory_on_calm_winds
+        ranges = 3.0 * np.array([[500.0, 1000.0], [1500.0, 2000.0]])
+        t, y = trajectory.at_range(ranges)
+        self.assertEqual(t.shape, (2, 2))
+        self.assertEqual(y.shape, (2, 2, 6))
+        np.testing.assert_allclose(
+            trajectory.time_of_flight(ranges), [[0.597, 1.471], [2.753, 4.379]],
+            rtol=1e-3)
+        np.testing.assert_allclose(
+            trajectory.speed_at_range(ranges), [[2108.8, 1408.3], [1016.6, 856.6]],
+            rtol=1e-3)
+        np.testing.assert_allclose(
+            12.0 * y[..., 2], [[-62.9, -331.3], [-1055.2, -2615.8]], rtol=1e-3)
+
+        energy = trajectory.energy_at_range(ranges, 175.0)
+        speed = trajectory.speed_at_range(ranges)
+        np.testing.assert_allclose(
+            energy, 175.0 / 7000.0 * speed**2 / (2.0 * 32.17405))
+
+        # The same points looked up by time of flight
+        np.testing.assert_allclose(trajectory.speed_at_time(t), speed)
+        np.testing.assert_allclose(
+            trajectory.energy_at_time(t, 175.0), energy, rtol=1e-12)
+        self.assertTrue(np.isnan(trajectory.energy_at_time(10.0, 175.0)))
+
+        # Outside of the trajectory
+        t, y = trajectory.at_range([-10.0, 7000.0])
+        self.assertTrue(np.isnan(t).all() and np.isnan(y).all())
+        self.assertTrue(np.isnan(trajectory.at_time([-1.0, 10.0])).all())
+
+    def test_wind_zones(self):
+        from ballistics.wind import WindProfile
+
+        profile = WindProfile(
+            [[0.0, 5.0, 0.0], [0.0, -10.0, 0.0]], ranges=[0.0, 1500.0])
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=profile, ranges=self.ranges,
+            dense_trajectory=True)
+
+        _, y = result.trajectory.at_range(self.ranges)
+        for i, y_ref in enumerate(result.y_events):
+            np.testing.assert_allclose(y[i], y_ref[0], rtol=1e-9, atol=1e-9)
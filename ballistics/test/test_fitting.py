@@ -0,0 +1,85 @@
+from ballistics.trajectory import *
+from ballistics.batch import *
+from ballistics.fitting import *
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+
+class TestFitting(unittest.TestCase):
+    def setUp(self):
+        self.table = parse_drag_table('ballistics/data/mcg7.txt')
+        self.pm_traj = PointMassTrajectory(self.table)
+
+        rng = np.random.default_rng(1)
+        num_shots = 20
+        speed = rng.uniform(2400.0, 3100.0, num_shots)
+        angle = rng.uniform(0.0, 0.01, num_shots)
+        self.v0 = speed[:, None] * np.stack(
+            (np.cos(angle), np.zeros(num_shots), np.sin(angle)), axis=1)
+        self.bc = rng.uniform(0.25, 0.45, num_shots)
+        self.ranges = np.linspace(50.0, 3000.0, 30)
+
+    def test_fit_bc(self):
+        t, y = calculate_trajectories(
+            self.pm_traj, np.zeros(3), self.v0, self.bc, self.ranges)
+        speed = np.linalg.norm(y[:, :, 3:], axis=2)
+
+        bc = fit_bc(
+            self.pm_traj, np.zeros(3), self.v0, self.ranges,
+            {'speed': speed, 'drop': y[:, :, 2], 'tof': t},
+            bc0=0.3, per_shot=True)
+        np.testing.assert_allclose(bc, self.bc, rtol=1e-5)
+
+        # Single BC shared by every shot, only the speed near the muzzle known
+        t, y = calculate_trajectories(
+            self.pm_traj, np.zeros(3), self.v0, 0.35, self.ranges)
+        speed = np.linalg.norm(y[:, :, 3:], axis=2)
+        speed[:, 10:] = np.nan
+
+        bc = fit_bc(
+            self.pm_traj, np.zeros(3), self.v0, self.ranges, {'speed': speed})
+        self.assertAlmostEqual(bc, 0.35, places=5)
+
+    def test_not_converged(self):
+        t, y = calculate_trajectories(
+            self.pm_traj, np.zeros(3), self.v0, self.bc, self.ranges)
+        observations = {'speed': np.linalg.norm(y[:, :, 3:], axis=2)}
+        args = (self.pm_traj, np.zeros(3), self.v0, self.ranges, observations)
+
+        bc, converged, cost = fit_bc(*args, per_shot=True, full_output=True)
+        self.assertTrue(converged.all())
+        self.assertEqual(cost.shape, bc.shape)
+
+        # Too few iterations to get there from the initial guess
+        with mock.patch('ballistics.fitting.MAX_FIT_ITERATIONS', 1):
+            with self.assertRaises(Exception):
+                fit_bc(*args, bc0=0.1, per_shot=True)
+            bc, converged, cost = fit_bc(
+                *args, bc0=0.1, per_shot=True, full_output=True)
+        self.assertFalse(converged.any())
+        self.assertTrue((cost > 0.0).all())
+
+        knots = np.array([1.5, 2.5])
+        with mock.patch('ballistics.fitting.MAX_FIT_ITERATIONS', 1):
+            with self.assertRaises(Exception):
+                fit_form_factor(
+                    self.pm_traj, np.zeros(3), self.v0, 0.5 * self.bc,
+                    self.ranges, observations, knots)
+
+    def test_fit_form_factor(self):
+        knots = np.array([1.2, 1.6, 2.0, 2.4, 2.8])
+        expected = np.array([0.03, -0.02, 0.05, 0.01, -0.03])
+        true_traj = PointMassTrajectory(
+            apply_form_factor(self.table, knots, expected))
+
+        t, y = calculate_trajectories(
+            true_traj, np.zeros(3), self.v0, self.bc, self.ranges)
+        speed = np.linalg.norm(y[:, :, 3:], axis=2)
+
+        coefficients = fit_form_factor(
+            self.pm_traj, np.zeros(3), self.v0, self.bc, self.ranges,
+            {'speed': speed}, knots)
+        np.testing.assert_allclose(coefficients, expected, atol=1e-3)
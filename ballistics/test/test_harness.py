@@ -0,0 +1,92 @@
+from ballistics.harness import *
+
+import tempfile
+import unittest
+
+
+class TestHarness(unittest.TestCase):
+    def setUp(self):
+        self.scenarios = load_scenarios()
+
+    def test_scenarios_match_tables(self):
+        results = run_harness(self.scenarios, [REFERENCE_METHOD], workers=2)
+        self.assertEqual(len(results), len(self.scenarios))
+
+        for scenario, result in zip(self.scenarios, results):
+            self.assertLess(result['error'], 1e-9)
+            self.assertGreater(result['time'], 0.0)
+            self.assertLessEqual(result['table_error'], scenario['tolerance'],
+                                 scenario['name'])
+
+    def test_stays_on_frontier(self):
+        # Cheap modes of each kind, the full set runs from the command line
+        modes = [
+            ('RK45', {'rtol': 1e-7, 'atol': 1e-7}),
+            ('LSODA', {'rtol': 1e-5, 'atol': 1e-5}),
+            ('DOP853', {'rtol': 1e-3, 'atol': 1e-3}),
+            ('batch', {'h': 1.0 / 60.0}),
+            ('auto', {'accuracy': 1e-2})
+        ]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Small calibration bracketing the scenarios
+            calibration_options = dict(
+                machs=(2.5, 3.5),
+                bcs=(0.3, 0.6),
+                ranges=(1500.0, 6000.0),
+                candidates=[
+                    ('LSODA', {'rtol': 1e-3, 'atol': 1e-3}),
+                    ('RK45', {'rtol': 1e-5, 'atol': 1e-5}),
+                    ('RK45', {'rtol': 1e-7, 'atol': 1e-7})
+                ],
+                cache_dir=cache_dir
+            )
+            rows = pareto_table(run_harness(
+                self.scenarios, modes,
+                calibration_options=calibration_options))
+
+        self.assertEqual(len(rows), len(modes))
+        self.assertEqual(check_frontier(rows, load_frontier()), [])
+
+    def test_frontier_checks(self):
+        frontier = {
+            'fast(h=1)': {'error': 1e-2, 'nfev': 100, 'pareto': True},
+            'slow(h=1)': {'error': 1e-2, 'nfev': 1000, 'pareto': False}
+        }
+
+        def row(mode, error, nfev):
+            return {'mode': mode, 'method': mode.split('(')[0],
+                    'error': error, 'nfev': nfev, 'time': 0.0}
+
+        # Stored modes must not regress
+        self.assertEqual(check_frontier([row('fast(h=1)', 1e-2, 100)], frontier), [])
+        self.assertEqual(len(check_frontier([row('fast(h=1)', 1.0, 100)], frontier)), 1)
+        self.assertEqual(len(check_frontier([row('fast(h=1)', 1e-2, 200)], frontier)), 1)
+
+        # The automatic selection must meet its accuracy
+        auto = row('auto(accuracy=0.01)', 1e-2, 100)
+        auto['options'] = {'accuracy': 1e-2}
+        self.assertEqual(check_frontier([auto], frontier), [])
+        auto['error'] = 1e-1
+        self.assertEqual(len(check_frontier([auto], frontier)), 1)
+
+        # New modes must not be dominated by the frontier
+        self.assertEqual(check_frontier([row('new(h=1)', 1.0, 50)], frontier), [])
+        self.assertEqual(check_frontier([row('new(h=1)', 1e-3, 500)], frontier), [])
+        self.assertEqual(len(check_frontier([row('new(h=1)', 1.0, 500)], frontier)), 1)
+
+        rows = pareto_table([
+            {'method': 'a', 'options': {}, 'error': 1e-3, 'table_error': 0.0,
+             'nfev': 100, 'time': 1.0},
+            {'method': 'b', 'options': {}, 'error': 1e-2, 'table_error': 0.0,
+             'nfev': 200, 'time': 0.5},
+            {'method': 'c', 'options': {}, 'error': 1e-1, 'table_error': 0.0,
+             'nfev': 300, 'time': 2.0}
+        ])
+        self.assertEqual([r['mode'] for r in rows], ['a()', 'b()', 'c()'])
+        self.assertEqual([r['pareto_time'] for r in rows], [True, True, False])
+        self.assertEqual([r['pareto_nfev'] for r in rows], [True, False, False])
+        self.assertIn('a()', format_table(rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
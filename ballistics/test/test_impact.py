@@ -0,0 +1,117 @@
+from ballistics.trajectory import *
+from ballistics.impact import *
+
+import unittest
+
+import numpy as np
+
+
+class TestImpact(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg1.txt'))
+        self.x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        self.v0 = 2800.0 * np.array([np.cos(0.02), 0.0, np.sin(0.02)])
+        self.bc = 0.5
+        self.options = dict(method='DOP853', rtol=1e-10, atol=1e-10)
+
+    def test_flat_ground(self):
+        ground = TerrainProfile([0.0, 1000.0], [-5.0, -5.0])
+        index, t, y = self.pm_traj.calculate_impact(
+            self.x0, self.v0, self.bc, [ground], **self.options)
+
+        def floor(t, y):
+            return y[2] + 5.0
+        floor.terminal = True
+        floor.direction = -1
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, events=[floor], **self.options)
+
+        self.assertEqual(index, 0)
+        self.assertAlmostEqual(t, result.t_events[0][0], places=9)
+        np.testing.assert_allclose(y, result.y_events[0][0], atol=1e-6)
+
+    def test_ridge_within_step(self):
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, dense_trajectory=True, **self.options)
+        trajectory = result.trajectory
+
+        # Narrow ridge peaking in the middle of a step, with the trajectory
+        # above the ground at both ends of the step
+        t_mid = 0.5 * (trajectory.t_bounds[3] + trajectory.t_bounds[4])
+        x_mid, _, z_mid = trajectory.at_time(t_mid)[:3]
+        ridge = TerrainProfile(
+            [x_mid - 2.0, x_mid, x_mid + 2.0],
+            [z_mid - 10.0, z_mid + 1.0, z_mid - 10.0])
+
+        t = ridge.crossing(trajectory)
+        self.assertLess(t, t_mid)
+        y = trajectory.at_time(t)
+        self.assertAlmostEqual(y[2], ridge.height(y[0]), places=6)
+
+        # Brute force scan for the first time below the ground
+        times = np.linspace(0.0, trajectory.t_end, 200001)
+        states = trajectory.at_time(times)
+        below = states[:, 2] <= ridge.height(states[:, 0])
+        self.assertAlmostEqual(t, times[np.argmax(below)], places=4)
+
+    def test_plane_near_apex(self):
+        v0 = 2800.0 * np.array([np.cos(0.05), 0.0, np.sin(0.05)])
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, v0, self.bc, dense_trajectory=True, **self.options)
+        trajectory = result.trajectory
+
+        # Horizontal plane just under the apex, with the trajectory below it
+        # at both ends of the step the apex is in
+        times = np.linspace(0.0, trajectory.t_end, 200001)
+        states = trajectory.at_time(times)
+        apex = np.argmax(states[:, 2])
+        step = np.searchsorted(trajectory.t_bounds, times[apex]) - 1
+        z_ends = trajectory.at_time(trajectory.t_bounds[step:step + 2])[:, 2]
+        height = 0.5 * (states[apex, 2] + z_ends.max())
+        overhead = TargetPlane([0.0, 0.0, height], [0.0, 0.0, 1.0])
+
+        t = overhead.crossing(trajectory)
+        self.assertAlmostEqual(
+            t, times[np.argmax(states[:, 2] >= height)], places=4)
+
+        index, t_hit, y = self.pm_traj.calculate_impact(
+            self.x0, v0, self.bc, [overhead], **self.options)
+        self.assertEqual(index, 0)
+        self.assertAlmostEqual(t_hit, t, places=9)
+        self.assertAlmostEqual(y[2], height, places=6)
+
+    def test_planes(self):
+        distance = 1500.0
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, dense_trajectory=True, **self.options)
+        trajectory = result.trajectory
+
+        upright = TargetPlane.at_range(distance)
+        self.assertAlmostEqual(
+            upright.crossing(trajectory), trajectory.time_of_flight(distance),
+            places=9)
+
+        inclined = TargetPlane.at_range(distance, 2.0, np.radians(30.0))
+        t = inclined.crossing(trajectory)
+        self.assertAlmostEqual(inclined(t, trajectory.at_time(t)), 0.0, places=6)
+
+        # The plane leaning back is hit before the upright one
+        ground = TerrainProfile([0.0], [-1000.0])
+        index, t_hit, _ = self.pm_traj.calculate_impact(
+            self.x0, self.v0, self.bc, [ground, upright, inclined],
+            **self.options)
+        self.assertEqual(index, 2)
+        self.assertAlmostEqual(t_hit, t, places=9)
+
+    def test_no_impact(self):
+        ground = TerrainProfile([0.0, 100.0], [-1e4, -1e4])
+        index, t, y = self.pm_traj.calculate_impact(
+            self.x0, self.v0, self.bc, [ground], max_time=1.0, **self.options)
+        self.assertEqual(index, -1)
+        self.assertTrue(np.isnan(t))
+        self.assertTrue(np.isnan(y).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
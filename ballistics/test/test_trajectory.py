@@ -1,7 +1,10 @@
 from ballistics.trajectory import *
 from ballistics.integration import *
 
+from concurrent.futures import ThreadPoolExecutor
+import time
 import unittest
+from unittest import mock
 
 import numpy as np
 
@@ -166,4 +169,144 @@ class TestTrajectoryCalcs(unittest.TestCase):
             self.assertAlmostEqual(drop, drop_ref, delta=EPSILON*abs(drop_ref))
             self.assertAlmostEqual(windage, windage_ref, delta=EPSILON*abs(windage_ref))
             self.assertAlmostEqual(speed, speed_ref, delta=EPSILON*abs(speed_ref))
-            self.assertAlmostEqual(t, t_ref, delta=EPSILON*abs(t_ref))
\ No newline at end of file
+            self.assertAlmostEqual(t, t_ref, delta=EPSILON*abs(t_ref))
+
+class TestInverseSolvers(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg7.txt'))
+
+    def test_vacuum_solutions(self):
+        muzzle_speed = 80 / 0.3048  # 80 m/s
+        bc = float('inf')
+        g = -ACCEL_GRAVITY[2]
+        x0 = np.zeros(3)
+        method = 'DOP853'
+
+        target_ranges = np.array([200.0, 400.0, 600.0])
+        low = 0.5 * np.arcsin(g * target_ranges / muzzle_speed**2)
+
+        angles = self.pm_traj.solve_for_firing_angle(
+            x0, muzzle_speed, bc, target_ranges, 0.0, method=method)
+        np.testing.assert_allclose(angles, low, atol=1e-7)
+
+        angles = self.pm_traj.solve_for_firing_angle(
+            x0, muzzle_speed, bc, target_ranges, 0.0, method=method,
+            high_angle=True)
+        np.testing.assert_allclose(angles, np.pi / 2.0 - low, atol=1e-7)
+
+        angle, max_range = self.pm_traj.solve_for_max_range(
+            x0, muzzle_speed, bc, method=method)
+        self.assertAlmostEqual(angle, np.pi / 4.0, places=4)
+        self.assertAlmostEqual(max_range, muzzle_speed**2 / g, places=4)
+
+        angles = np.radians([10.0, 30.0, 60.0])
+        t, y = self.pm_traj.calculate_max_ordinate(
+            x0, muzzle_speed, bc, angles, method=method)
+        vz = muzzle_speed * np.sin(angles)
+        np.testing.assert_allclose(t, vz / g)
+        np.testing.assert_allclose(y[:, 2], vz**2 / (2.0 * g))
+        np.testing.assert_allclose(y[:, 5], 0.0, atol=1e-9)
+
+    def test_firing_angle_with_drag(self):
+        x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        muzzle_speed = 2970.0
+        bc = 0.371
+        target_ranges = np.array([300.0, 1500.0, 3000.0, 6000.0])
+        target_elevations = np.array([0.0, -20.0, 50.0, 100.0])
+
+        for method in ('RK45', 'RungeKuttaMethod'):
+            angles = self.pm_traj.solve_for_firing_angle(
+                x0, muzzle_speed, bc, target_ranges, target_elevations,
+                method=method)
+
+            for angle, target_range, elevation in zip(
+                    angles, target_ranges, target_elevations):
+                v0 = muzzle_speed * np.array([np.cos(angle), 0.0, np.sin(angle)])
+                result = self.pm_traj.calculate_trajectory(
+                    x0, v0, bc, method=method, ranges=[target_range])
+                self.assertAlmostEqual(
+                    result.y_events[0][0, 2], elevation, places=5)
+
+        # Out of reach
+        angles = self.pm_traj.solve_for_firing_angle(
+            x0, 900.0, bc, [20000.0], [0.0])
+        self.assertTrue(np.isnan(angles).all())
+
+    def test_firing_angle_near_max_range(self):
+        x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        muzzle_speed = 2970.0
+        bc = 0.371
+
+        max_angle, max_range = self.pm_traj.solve_for_max_range(
+            x0, muzzle_speed, bc)
+        target_range = 0.999 * max_range
+
+        low = self.pm_traj.solve_for_firing_angle(
+            x0, muzzle_speed, bc, [target_range], [0.0])[0]
+        high = self.pm_traj.solve_for_firing_angle(
+            x0, muzzle_speed, bc, [target_range], [0.0], high_angle=True)[0]
+        self.assertLess(low, max_angle)
+        self.assertGreater(high, max_angle)
+
+        for angle in (low, high):
+            v0 = muzzle_speed * np.array([np.cos(angle), 0.0, np.sin(angle)])
+            result = self.pm_traj.calculate_trajectory(
+                x0, v0, bc, ranges=[target_range],
+                max_time=MAX_INVERSE_SIMULATION_TIME)
+            self.assertAlmostEqual(result.y_events[0][0, 2], 0.0, places=4)
+
+        # A lone target in vacuum, solved the same as within a batch
+        muzzle_speed = 80 / 0.3048
+        g = -ACCEL_GRAVITY[2]
+        target_range = 0.997 * muzzle_speed**2 / g
+        expected = 0.5 * np.arcsin(g * target_range / muzzle_speed**2)
+        for high_angle in (False, True):
+            angle = self.pm_traj.solve_for_firing_angle(
+                np.zeros(3), muzzle_speed, float('inf'), [target_range], 0.0,
+                method='DOP853', high_angle=high_angle)[0]
+            if high_angle:
+                self.assertAlmostEqual(angle, np.pi / 2.0 - expected, places=7)
+            else:
+                self.assertAlmostEqual(angle, expected, places=7)
+
+
+class TestThreadSafety(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg7.txt'))
+
+    def test_shared_instance(self):
+        x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        bcs = np.linspace(0.2, 0.6, 16)
+        ranges = [300.0, 1500.0, 3000.0]
+
+        def drop(bc):
+            result = self.pm_traj.calculate_trajectory(
+                x0, np.array([2800.0, 0.0, 0.0]), bc, method='DOP853',
+                ranges=ranges, rtol=1e-10, atol=1e-10)
+            return [y[0] for y in result.y_events]
+
+        expected = [drop(bc) for bc in bcs]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            actual = list(pool.map(drop, bcs))
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_calibrates_once(self):
+        calibration = {'candidates': []}
+
+        def slow_calibration(traj):
+            time.sleep(0.1)
+            return calibration
+
+        with mock.patch('ballistics.trajectory.load_calibration',
+                        side_effect=slow_calibration) as load, \
+                mock.patch('ballistics.trajectory.select_method',
+                           return_value=('RK45', {})):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                methods = list(pool.map(
+                    lambda _: self.pm_traj.select_method(2.5, 0.5), range(8)))
+
+        self.assertEqual(load.call_count, 1)
+        self.assertIs(self.pm_traj.calibration, calibration)
+        self.assertEqual(methods, [('RK45', {})] * 8)
@@ -0,0 +1,145 @@
+from ballistics.trajectory import *
+from ballistics.wind import *
+
+import unittest
+
+import numpy as np
+
+
+class TestWindProfile(unittest.TestCase):
+    def test_breakpoint_index(self):
+        rng = np.random.default_rng(2)
+        points = np.sort(rng.uniform(0.0, 3000.0, 25))
+        index = BreakpointIndex(points)
+
+        x = np.concatenate(
+            (rng.uniform(-100.0, 3100.0, 1000), points, [-np.inf, np.inf]))
+        expected = np.maximum(np.searchsorted(points, x, 'right') - 1, 0)
+
+        np.testing.assert_array_equal(index.index(x), expected)
+        for xi, ei in zip(x[:100], expected[:100]):
+            self.assertEqual(index.index(xi), ei)
+
+    def test_breakpoint_index_rounding(self):
+        rng = np.random.default_rng(3)
+        for _ in range(300):
+            points = np.sort(rng.uniform(0.0, 100.0, 30))
+            index = BreakpointIndex(points)
+
+            # Values next to each breakpoint are where the cell rounds wrong
+            x = np.concatenate((
+                np.nextafter(points, -np.inf), points,
+                np.nextafter(points, np.inf)))
+            expected = np.maximum(np.searchsorted(points, x, 'right') - 1, 0)
+
+            np.testing.assert_array_equal(index.index(x), expected)
+            for xi, ei in zip(x, expected):
+                self.assertEqual(index.index(xi), ei)
+
+    def test_lookup(self):
+        winds = np.arange(2 * 3 * 3, dtype=float).reshape(2, 3, 3)
+        profile = WindProfile(winds, ranges=[0.0, 300.0], heights=[0.0, 10.0, 20.0])
+        np.testing.assert_array_equal(profile(100.0, 15.0), winds[0, 1])
+        np.testing.assert_array_equal(profile(300.0, -5.0), winds[1, 0])
+        np.testing.assert_array_equal(
+            profile(np.array([100.0, 300.0]), np.array([15.0, 25.0])),
+            winds[[0, 1], [1, 2]])
+
+        profile = WindProfile(
+            winds, ranges=[0.0, 300.0], heights=[0.0, 10.0, 20.0], interpolate=True)
+        np.testing.assert_allclose(
+            profile(150.0, 5.0),
+            (winds[0, 0] + winds[0, 1] + winds[1, 0] + winds[1, 1]) / 4.0)
+        np.testing.assert_allclose(profile(1000.0, 30.0), winds[1, 2])
+
+        with self.assertRaises(Exception):
+            WindProfile(np.zeros((2, 3)), ranges=[0.0, 300.0, 600.0])
+        with self.assertRaises(Exception):
+            WindProfile(np.zeros((2, 3)), ranges=[300.0, 0.0])
+
+
+class TestWindZoneTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.pm_traj = PointMassTrajectory(
+            parse_drag_table('ballistics/data/mcg7.txt'))
+        self.x0 = np.array([0.0, 0.0, -1.5 / 12.0])
+        self.v0 = np.array([2970.0, 0.0, 10.0])
+        self.bc = 0.371
+        self.ranges = [300.0, 600.0, 900.0, 1500.0, 2400.0]
+
+    def test_uniform_profile(self):
+        wind = np.array([2.0, 14.0, 0.0])
+        expected = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=wind, ranges=self.ranges)
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=WindProfile([wind]),
+            ranges=self.ranges)
+
+        for y, y_ref in zip(result.y_events, expected.y_events):
+            np.testing.assert_allclose(y, y_ref)
+
+    def test_wind_zones(self):
+        profile = WindProfile(
+            [[0.0, 5.0, 0.0], [0.0, -10.0, 0.0], [0.0, 15.0, 0.0]],
+            ranges=[0.0, 600.0, 1500.0])
+
+        reference = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=profile, method='DOP853',
+            ranges=self.ranges, rtol=1e-12, atol=1e-12)
+
+        for method in ('RK45', 'LSODA', 'RungeKuttaMethod'):
+            result = self.pm_traj.calculate_trajectory(
+                self.x0, self.v0, self.bc, wind=profile, method=method,
+                ranges=self.ranges)
+
+            # The ranges on the zone boundaries are reported only once
+            self.assertEqual([len(t) for t in result.t_events], [1] * 5)
+            for y, y_ref in zip(result.y_events, reference.y_events):
+                np.testing.assert_allclose(y[0, :3], y_ref[0, :3], atol=1e-3)
+
+        # Matches stitching the zones by hand
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, self.v0, self.bc, wind=profile.winds[0, 0],
+            method='DOP853', ranges=[600.0], rtol=1e-12, atol=1e-12)
+        result = self.pm_traj.calculate_trajectory(
+            result.y_events[0][0, :3], result.y_events[0][0, 3:], self.bc,
+            wind=profile.winds[1, 0], method='DOP853', ranges=[1500.0],
+            rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(
+            result.y_events[0][0], reference.y_events[3][0], rtol=1e-9)
+
+    def test_height_bands(self):
+        profile = WindProfile(
+            [[0.0, 5.0, 0.0], [0.0, 20.0, 0.0]], heights=[0.0, 20.0])
+        v0 = np.array([2970.0, 0.0, 100.0])
+
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, v0, self.bc, wind=profile, ranges=self.ranges,
+            dense_output=True)
+        reference = self.pm_traj.calculate_trajectory(
+            self.x0, v0, self.bc, wind=profile, method='DOP853',
+            ranges=self.ranges, rtol=1e-12, atol=1e-12)
+
+        for y, y_ref in zip(result.y_events, reference.y_events):
+            np.testing.assert_allclose(y[0, :3], y_ref[0, :3], atol=1e-3)
+        t = reference.t_events[2][0]
+        np.testing.assert_allclose(
+            result.sol(t)[:3], reference.y_events[2][0, :3], atol=1e-2)
+
+    def test_zeroing(self):
+        profile = WindProfile(
+            [[0.0, 10.0, 0.0], [0.0, -10.0, 0.0]], ranges=[0.0, 450.0],
+            interpolate=True)
+        zero_range = 900.0
+
+        ver_angle, hor_angle = self.pm_traj.solve_for_initial_velocity(
+            self.x0, 2970.0, self.bc, zero_range, 0.0, wind=profile)
+        v0 = 2970.0 * np.array([
+            np.cos(ver_angle) * np.cos(hor_angle),
+            np.sin(hor_angle),
+            np.sin(ver_angle) * np.cos(hor_angle)
+        ])
+        result = self.pm_traj.calculate_trajectory(
+            self.x0, v0, self.bc, wind=profile, ranges=[zero_range])
+
+        np.testing.assert_allclose(result.y_events[0][0, 1:3], 0.0, atol=1e-4)
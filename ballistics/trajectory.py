@@ -1,20 +1,28 @@
 from .environment import *
 from .integration import *
+from .calibration import (DEFAULT_ACCURACY, STANDARD_AIR_DENSITY, effective_bc,
+                          load_calibration, select_method)
+from .dense import DenseTrajectory
+from .impact import find_impact
+from .wind import BreakpointIndex, WindProfile
+
+import threading
 
 import numpy as np
-from scipy.interpolate import make_interp_spline
-from scipy.integrate import solve_ivp
+from scipy.interpolate import PPoly, make_interp_spline
+from scipy.integrate import OdeSolution, solve_ivp
+from scipy.optimize import brentq, minimize_scalar
 
 MAX_SIMULATION_TIME = 20.0
+# High angle fire can stay in the air much longer
+MAX_INVERSE_SIMULATION_TIME = 180.0
 ACCEL_GRAVITY = np.array([0.0, 0.0, -32.17405])
 
-CUSTOM_ODE_SOLVERS = {
-    'EulerMethod': EulerMethod,
-    'TwoStepAdamsBashforth': TwoStepAdamsBashforth,
-    'HeunsMethod': HeunsMethod,
-    'BeemansAlgorithm': BeemansAlgorithm,
-    'RungeKuttaMethod': RungeKuttaMethod
-}
+# Launch angle search used by the inverse solvers
+MAX_LAUNCH_ANGLE = np.radians(89.5)
+ANGLE_SEARCH_STEP = np.radians(0.25)
+MAX_ANGLE_SEARCH_STEP = np.radians(5.0)
+ANGLE_TOLERANCE = 1e-10
 
 
 def parse_drag_table(filename: str):
@@ -25,10 +33,93 @@ def parse_drag_table(filename: str):
     return table
 
 
+class DragCurve:
+    """Drag spline as one cubic per interval between its knots, evaluated on
+    arrays of Mach numbers with NumPy alone.
+
+    Evaluating the BSpline holds the GIL, which serializes the threads of
+    the batch integrator. The pieces here are found through a breakpoint
+    index and evaluated with Horner's method, giving the same values as the
+    spline, extrapolation included.
+    """
+
+    def __init__(self, spline) -> None:
+        pp = PPoly.from_spline(spline)
+        # The repeated end knots make empty intervals
+        keep = np.diff(pp.x) > 0.0
+        self.index = BreakpointIndex(np.append(pp.x[:-1][keep], pp.x[-1]))
+
+        # Highest degree first, then the same for the derivative
+        self.coefficients = np.ascontiguousarray(pp.c[:, keep])
+        degree = self.coefficients.shape[0] - 1
+        self.slopes = self.coefficients[:-1] * \
+            np.arange(degree, 0, -1)[:, None]
+
+    def _evaluate(self, c: np.ndarray, mach):
+        i = np.minimum(self.index.index(mach), c.shape[1] - 1)
+        dm = mach - self.index.points[i]
+        y = c[0, i]
+        for k in range(1, c.shape[0]):
+            y = y * dm + c[k, i]
+        return y
+
+    def __call__(self, mach):
+        """Drag coefficient at the Mach numbers."""
+        return self._evaluate(self.coefficients, mach)
+
+    def derivative(self, mach):
+        """Derivative of the drag coefficient with respect to the Mach
+        number.
+        """
+        return self._evaluate(self.slopes, mach)
+
+
 class PointMassTrajectory:
+    """Point mass trajectory model of a projectile with the given drag table.
+
+    An instance is thread-safe and can be shared by all the threads of an
+    application. The drag spline is never modified after construction,
+    every calculation keeps its state in local variables, and the lazy
+    calibration used by `method='auto'` runs at most once under a lock.
+    """
 
     def __init__(self, table: list[(float, float)]) -> None:
+        self.table = table
         self.cd_func = make_interp_spline(*zip(*table), k=3)
+        self.drag_curve = DragCurve(self.cd_func)
+        self.calibration = None
+        self._calibration_lock = threading.Lock()
+
+    def calibrate(self, **kwargs) -> dict:
+        """Benchmarks the ODE solvers on this drag table, or loads the result
+        from the disk cache, for use by `method='auto'`. The keyword arguments
+        are passed to `load_calibration`.
+        """
+
+        with self._calibration_lock:
+            self.calibration = load_calibration(self, **kwargs)
+            return self.calibration
+
+    def select_method(
+        self,
+        mach: float,
+        bc: float,
+        max_range: float = None,
+        accuracy: float = DEFAULT_ACCURACY,
+        density_air: float = STANDARD_AIR_DENSITY
+    ) -> (str, dict):
+        """Picks the cheapest solver and its options that keeps the position
+        error below `accuracy` ft, calibrating the drag table if needed.
+        Outside of the calibrated scenarios the reference method is picked.
+        """
+
+        if self.calibration is None:
+            with self._calibration_lock:
+                # Another thread may have calibrated while this one waited
+                if self.calibration is None:
+                    self.calibration = load_calibration(self)
+        return select_method(self.calibration, mach,
+                             effective_bc(bc, density_air), max_range, accuracy)
 
     def calculate_acceleration(
         self,
@@ -60,7 +151,8 @@ class PointMassTrajectory:
         temp: float = 59.0,
         pressure: float = 29.92,
         rh: float = 0.0,
-        method: str = 'RK45'
+        method: str = 'RK45',
+        **options
     ) -> (float, float):
 
         MAX_CONVERGENCE_STEPS = 100
@@ -71,6 +163,14 @@ class PointMassTrajectory:
 
         range_reached.terminal = True
 
+        if method == 'auto':
+            mach = muzzle_speed / speed_sound(temp, rh, 0.0)
+            accuracy = options.pop('accuracy', DEFAULT_ACCURACY)
+            method, auto_options = self.select_method(
+                mach, bc, zero_range, accuracy,
+                air_density(temp, pressure, rh, 0.0))
+            options = {**auto_options, **options}
+
         # Initial guess of vertical angle
         ver_angle = np.arctan(zero_elevation / zero_range)
         ver_angle_low = ver_angle - np.radians(60)
@@ -113,7 +213,8 @@ class PointMassTrajectory:
                 pressure,
                 rh,
                 method,
-                events=range_reached
+                events=range_reached,
+                **options
             )
 
             if not result.y_events:
@@ -159,6 +260,205 @@ class PointMassTrajectory:
 
         return ver_angle, hor_angle
 
+    def solve_for_firing_angle(
+        self,
+        x0: np.ndarray,
+        muzzle_speed: float,
+        bc: float,
+        target_ranges,
+        target_elevations,
+        wind: np.ndarray = np.zeros(3),
+        temp: float = 59.0,
+        pressure: float = 29.92,
+        rh: float = 0.0,
+        method: str = 'RK45',
+        high_angle: bool = False,
+        **options
+    ) -> np.ndarray:
+        """Finds the vertical launch angle that hits each target. The
+        targets share one set of trajectories: each is bracketed using the
+        trajectories already computed for the others, then refined with
+        Brent's method.
+
+        Returns the angles in radians, NaN for targets that are out of reach.
+        With `high_angle` the solution above the angle of maximum range is
+        returned instead.
+        """
+
+        target_ranges, target_elevations = np.broadcast_arrays(
+            np.asarray(target_ranges, dtype=float),
+            np.asarray(target_elevations, dtype=float))
+        if np.any(target_ranges <= x0[0]):
+            raise Exception('Targets must be downrange of the muzzle')
+
+        cache = _LaunchAngleCache(
+            self, x0, muzzle_speed, bc, np.min(target_elevations) - 1.0,
+            np.max(target_ranges), wind, temp, pressure, rh, method, options)
+
+        angles = np.full(target_ranges.shape, np.nan)
+        for k in np.ndindex(target_ranges.shape):
+            target_range = target_ranges[k]
+            elevation = target_elevations[k]
+
+            def height_error(angle: float):
+                return cache.height_at_range(angle, target_range) - elevation
+
+            # Aiming straight at the target always falls short
+            angle = np.arctan2(elevation - x0[2], target_range - x0[0])
+            bracket = cache.find_sign_change(height_error, angle, rising=True)
+            if bracket is None:
+                # Near the maximum range one search step can cross both
+                # solutions. Both are on either side of the highest point.
+                _, peak = cache.find_peak(height_error, angle)
+                if peak >= 0.0:
+                    bracket = cache.find_sign_change(
+                        height_error, angle, rising=True)
+            if bracket is not None and high_angle:
+                bracket = cache.find_sign_change(
+                    height_error, bracket[1], rising=False)
+            if bracket is None:
+                continue
+
+            angles[k] = brentq(height_error, *bracket, xtol=ANGLE_TOLERANCE)
+
+        return angles
+
+    def solve_for_max_range(
+        self,
+        x0: np.ndarray,
+        muzzle_speed: float,
+        bc: float,
+        elevations=0.0,
+        wind: np.ndarray = np.zeros(3),
+        temp: float = 59.0,
+        pressure: float = 29.92,
+        rh: float = 0.0,
+        method: str = 'RK45',
+        **options
+    ) -> (np.ndarray, np.ndarray):
+        """Finds the launch angle giving the farthest impact on each of the
+        horizontal planes at `elevations`. The maximum of each is bracketed on
+        a shared grid of trajectories and refined with Brent's method.
+
+        Returns the angles in radians and the ranges in ft.
+        """
+
+        elevations = np.asarray(elevations, dtype=float)
+        cache = _LaunchAngleCache(
+            self, x0, muzzle_speed, bc, np.min(elevations) - 1.0, None,
+            wind, temp, pressure, rh, method, options)
+
+        grid = np.arange(0.0, MAX_LAUNCH_ANGLE, MAX_ANGLE_SEARCH_STEP)
+
+        angles = np.full(elevations.shape, np.nan)
+        ranges = np.full(elevations.shape, np.nan)
+        for k in np.ndindex(elevations.shape):
+            elevation = elevations[k]
+
+            def negative_range(angle: float):
+                return -cache.impact_range(angle, elevation)
+
+            values = np.array([negative_range(a) for a in grid])
+            values[np.isnan(values)] = np.inf
+            if not np.isfinite(values).any():
+                continue
+
+            i = int(np.clip(np.argmin(values), 1, grid.size - 2))
+            if values[i] > min(values[i - 1], values[i + 1]):
+                # The maximum is at the edge of the grid
+                i = int(np.argmin(values))
+                angles[k] = grid[i]
+                ranges[k] = -values[i]
+                continue
+
+            result = minimize_scalar(
+                negative_range,
+                bracket=(grid[i - 1], grid[i], grid[i + 1]),
+                method='brent',
+                tol=ANGLE_TOLERANCE
+            )
+            angles[k] = result.x
+            ranges[k] = -result.fun
+
+        return angles, ranges
+
+    def calculate_max_ordinate(
+        self,
+        x0: np.ndarray,
+        muzzle_speed: float,
+        bc: float,
+        angles,
+        wind: np.ndarray = np.zeros(3),
+        temp: float = 59.0,
+        pressure: float = 29.92,
+        rh: float = 0.0,
+        method: str = 'RK45',
+        **options
+    ) -> (np.ndarray, np.ndarray):
+        """Calculates the apex of the trajectory for each vertical launch
+        angle.
+
+        Returns the times of flight in s and the states (x, y, z, vx, vy, vz)
+        at the apex, NaN for angles without one.
+        """
+
+        angles = np.asarray(angles, dtype=float)
+        cache = _LaunchAngleCache(
+            self, x0, muzzle_speed, bc, None, None, wind, temp, pressure, rh,
+            method, options)
+
+        times = np.full(angles.shape, np.nan)
+        states = np.full(angles.shape + (6,), np.nan)
+        for k in np.ndindex(angles.shape):
+            t_events = cache(angles[k]).t_events[0]
+            if t_events.size:
+                times[k] = t_events[0]
+                states[k] = cache(angles[k]).y_events[0][0]
+
+        return times, states
+
+    def calculate_impact(
+        self,
+        x0: np.ndarray,
+        v0: np.ndarray,
+        bc: float,
+        surfaces,
+        wind: np.ndarray = np.zeros(3),
+        temp: float = 59.0,
+        pressure: float = 29.92,
+        rh: float = 0.0,
+        method: str = 'RK45',
+        max_time: float = MAX_SIMULATION_TIME,
+        **options
+    ) -> (int, float, np.ndarray):
+        """Calculates where the projectile first hits any of the surfaces.
+
+        Parameters
+        ----------
+        surfaces : list
+            TerrainProfile and TargetPlane instances. They stop the
+            integration as events, then the exact crossing is searched on the
+            dense output.
+
+        Returns
+        -------
+        index : int
+            Index of the surface that is hit, -1 if none within `max_time`
+        t : float
+            Time of flight in s to the impact
+        y : np.ndarray
+            State (x, y, z, vx, vy, vz) at the impact
+        """
+
+        result = self.calculate_trajectory(
+            x0, v0, bc, wind, temp, pressure, rh, method,
+            events=list(surfaces),
+            max_time=max_time,
+            dense_trajectory=True,
+            **options
+        )
+        return find_impact(result.trajectory, surfaces)
+
     def calculate_trajectory(
         self,
         x0: np.ndarray,
@@ -172,19 +472,42 @@ class PointMassTrajectory:
         t_eval=None,
         events=None,
         ranges=None,
+        max_time: float = MAX_SIMULATION_TIME,
+        dense_trajectory: bool = False,
+        **options
     ):
-        method = CUSTOM_ODE_SOLVERS.get(method, method)
-
         density_air = air_density(temp, pressure, rh, 0.0)
         v_sound = speed_sound(temp, rh, 0.0)
 
+        if method == 'auto':
+            # The accuracy is only meaningful to the method selection
+            accuracy = options.pop('accuracy', DEFAULT_ACCURACY)
+            # Without ranges the trajectory is flown to `max_time`, which can
+            # go past the calibration and picks the reference method
+            max_range = np.inf if ranges is None else max(ranges)
+            method, auto_options = self.select_method(
+                np.linalg.norm(v0) / v_sound, bc, max_range, accuracy,
+                density_air)
+            options = {**auto_options, **options}
+
+        method = CUSTOM_ODE_SOLVERS.get(method, method)
+
         y0 = np.concatenate((x0, v0))
 
-        def fun(t: float, y: np.ndarray):
-            pos_derivative = y[3:]
-            vel_derivative = self.calculate_acceleration(
-                y[3:], v_sound, bc, density_air, wind)
-            return np.concatenate((pos_derivative, vel_derivative))
+        def make_fun(wind):
+            if isinstance(wind, WindProfile):
+                def fun(t: float, y: np.ndarray):
+                    pos_derivative = y[3:]
+                    vel_derivative = self.calculate_acceleration(
+                        y[3:], v_sound, bc, density_air, wind(y[0], y[2]))
+                    return np.concatenate((pos_derivative, vel_derivative))
+            else:
+                def fun(t: float, y: np.ndarray):
+                    pos_derivative = y[3:]
+                    vel_derivative = self.calculate_acceleration(
+                        y[3:], v_sound, bc, density_air, wind)
+                    return np.concatenate((pos_derivative, vel_derivative))
+            return fun
         
         if ranges is not None:
             if events is None:
@@ -192,13 +515,345 @@ class PointMassTrajectory:
                 # Stop on the last range
                 events[-1].terminal = True
 
+        if dense_trajectory:
+            options['dense_output'] = True
+
+        if isinstance(wind, WindProfile):
+            result = _solve_in_wind_zones(
+                make_fun, wind, y0, method, t_eval, events, max_time, options)
+        else:
+            result = solve_ivp(
+                make_fun(wind),
+                (0.0, max_time),
+                y0,
+                method=method,
+                t_eval=t_eval,
+                events=events,
+                **options
+            )
+
+        if dense_trajectory:
+            # Queried at any range or time afterwards without integrating
+            result.trajectory = DenseTrajectory.from_solution(result.sol)
+
+        return result
+
+
+class _LaunchAngleCache:
+    """Trajectories at every launch angle tried so far by an inverse solver,
+    kept with their dense output so that any target can query them without
+    integrating again.
+    """
+
+    def __init__(
+        self,
+        traj,
+        x0,
+        muzzle_speed,
+        bc,
+        floor,
+        max_range,
+        wind,
+        temp,
+        pressure,
+        rh,
+        method,
+        options
+    ):
+        self.traj = traj
+        self.x0 = x0
+        self.muzzle_speed = muzzle_speed
+        self.bc = bc
+        options = {'max_time': MAX_INVERSE_SIMULATION_TIME, **options}
+        if method == 'auto':
+            # Select once for every angle. Without a farthest range the
+            # trajectories are not bounded, which picks the reference method.
+            accuracy = options.pop('accuracy', DEFAULT_ACCURACY)
+            mach = muzzle_speed / speed_sound(temp, rh, 0.0)
+            method, auto_options = traj.select_method(
+                mach, bc, np.inf if max_range is None else max_range,
+                accuracy, air_density(temp, pressure, rh, 0.0))
+            options = {**auto_options, **options}
+        self.kwargs = dict(wind=wind, temp=temp, pressure=pressure, rh=rh,
+                           method=method, dense_output=True, **options)
+        self.floor = floor
+        self.results = {}
+
+        def apex(t: float, y: np.ndarray):
+            return y[5]
+
+        apex.direction = -1.0
+        # Nothing else to look for past the apex without a floor or range
+        apex.terminal = floor is None and max_range is None
+        self.events = [apex]
+
+        if floor is not None:
+            # Done once descending below every target
+            def floor_reached(t: float, y: np.ndarray):
+                return y[2] - floor
+
+            floor_reached.terminal = True
+            floor_reached.direction = -1.0
+            self.events.append(floor_reached)
+
+        if max_range is not None:
+            def range_reached(t: float, y: np.ndarray):
+                return y[0] - max_range
+
+            range_reached.terminal = True
+            self.events.append(range_reached)
+
+    def __call__(self, angle: float):
+        angle = float(angle)
+        result = self.results.get(angle)
+        if result is None:
+            v0 = self.muzzle_speed * np.array([np.cos(angle), 0.0, np.sin(angle)])
+            result = self.traj.calculate_trajectory(
+                self.x0, v0, self.bc, events=self.events, **self.kwargs)
+            self.results[angle] = result
+        return result
+
+    def height_at_range(self, angle: float, target_range: float) -> float:
+        """Height of the trajectory at the range. If it falls short, the
+        height at the end minus the remaining distance, which keeps the
+        result continuous for the root finders.
+        """
+
+        result = self(angle)
+        x = result.y[0]
+        if x[-1] < target_range - 1e-6:
+            # Still in the air when out of time counts as falling short
+            return min(result.y[2, -1], self.floor) - (target_range - x[-1])
+
+        i = min(max(int(np.searchsorted(x, target_range)), 1), x.size - 1)
+        if x[i] <= target_range:
+            # Stopped right at the range
+            return result.y[2, i]
+
+        t = brentq(lambda t: result.sol(t)[0] - target_range,
+                   result.t[i - 1], result.t[i])
+        return result.sol(t)[2]
+
+    def impact_range(self, angle: float, elevation: float) -> float:
+        """Range where the trajectory descends through the elevation, NaN if
+        it does not.
+        """
+
+        result = self(angle)
+        z = result.y[2]
+        descending = np.flatnonzero((z[:-1] >= elevation) & (z[1:] < elevation))
+        if not descending.size:
+            return np.nan
+
+        i = descending[-1] + 1
+        t = brentq(lambda t: result.sol(t)[2] - elevation,
+                   result.t[i - 1], result.t[i])
+        return result.sol(t)[0]
+
+    def find_sign_change(self, fun, start: float, rising: bool):
+        """Searches upwards from `start` for an interval where `fun` goes
+        from negative to positive (or the reverse if not `rising`). The
+        angles already integrated are tried first, then new ones with a
+        growing step.
+        """
+
+        sign = 1.0 if rising else -1.0
+
+        angle = start
+        value = sign * fun(angle)
+        if value > 0.0:
+            return None
+
+        for cached in sorted(a for a in list(self.results) if a > start):
+            cached_value = sign * fun(cached)
+            if cached_value >= 0.0:
+                return angle, cached
+            angle = cached
+
+        step = ANGLE_SEARCH_STEP
+        while angle < MAX_LAUNCH_ANGLE:
+            next_angle = min(angle + step, MAX_LAUNCH_ANGLE)
+            if sign * fun(next_angle) >= 0.0:
+                return angle, next_angle
+            angle = next_angle
+            step = min(1.5 * step, MAX_ANGLE_SEARCH_STEP)
+
+        return None
+
+    def find_peak(self, fun, start: float) -> (float, float):
+        """Finds the angle above `start` where `fun` is largest and its
+        value. The largest value among the angles already integrated is
+        refined with Brent's method, and the angles it tries are cached.
+        """
+
+        angles = np.array(sorted(a for a in list(self.results) if a >= start))
+        values = np.array([fun(a) for a in angles])
+        values[np.isnan(values)] = -np.inf
+
+        i = int(np.argmax(values))
+        if 0 < i < angles.size - 1:
+            result = minimize_scalar(
+                lambda angle: -fun(angle),
+                bracket=(angles[i - 1], angles[i], angles[i + 1]),
+                method='brent',
+                tol=ANGLE_TOLERANCE
+            )
+            if -result.fun > values[i]:
+                return result.x, -result.fun
+
+        return angles[i], values[i]
+
+
+def _boundary_event(boundary: float, axis: int, direction: float):
+    def event(t: float, y: np.ndarray):
+        return y[axis] - boundary
+
+    event.terminal = True
+    event.direction = direction
+    return event
+
+
+def _solve_in_wind_zones(
+    make_fun,
+    profile,
+    y0,
+    method,
+    t_eval,
+    events,
+    max_time,
+    options
+):
+    """Integrates one wind zone at a time, stopping on each zone boundary
+    and restarting from there. The solver never steps across the abrupt
+    change of the wind, which would otherwise cost accuracy. Within a zone of
+    a piecewise constant profile the wind is fixed, with interpolation it is
+    looked up from the profile.
+    """
+
+    if events is None:
+        user_events = []
+    elif callable(events):
+        user_events = [events]
+    else:
+        user_events = list(events)
+    num_events = len(user_events)
+
+    x_bounds = profile.range_boundaries
+    z_bounds = profile.height_boundaries
+
+    # Number of boundaries behind the projectile, which for a piecewise
+    # constant profile is also the index of the current zone
+    kx = int(np.searchsorted(x_bounds, y0[0], 'right'))
+    kz = int(np.searchsorted(z_bounds, y0[2], 'right'))
+
+    t0 = 0.0
+    y = y0
+    segments = []
+    while True:
+        if profile.interpolate:
+            fun = make_fun(profile)
+        else:
+            fun = make_fun(profile.winds[kx, kz])
+
+        # The range boundaries are only crossed going forward. A height
+        # boundary that was just crossed only counts when crossed back.
+        zone_events = []
+        if kx < len(x_bounds):
+            zone_events.append((0, 1, _boundary_event(x_bounds[kx], 0, 1.0)))
+        if kz > 0:
+            zone_events.append((2, -1, _boundary_event(z_bounds[kz - 1], 2, -1.0)))
+        if kz < len(z_bounds):
+            zone_events.append((2, 1, _boundary_event(z_bounds[kz], 2, 1.0)))
+
+        segment_t_eval = None
+        if t_eval is not None:
+            t_eval = np.asarray(t_eval)
+            segment_t_eval = t_eval[t_eval > t0] if segments else t_eval
+
+        seg_events = user_events + [e for _, _, e in zone_events]
         result = solve_ivp(
             fun,
-            (0.0, MAX_SIMULATION_TIME),
-            y0,
+            (t0, max_time),
+            y,
             method=method,
-            t_eval=t_eval,
-            events=events
+            t_eval=segment_t_eval,
+            events=seg_events or None,
+            **options
         )
-
-        return result
+        segments.append((t0, result))
+
+        if result.status != 1:
+            break
+
+        # Find out which event stopped the integration
+        t_stop = max(te[-1] for te in result.t_events if te.size)
+        stopped_by_user = any(
+            getattr(event, 'terminal', False) and te.size and te[-1] == t_stop
+            for event, te in zip(user_events, result.t_events))
+        if stopped_by_user:
+            break
+
+        for n, (axis, step, _) in enumerate(zone_events):
+            te = result.t_events[num_events + n]
+            if te.size and te[-1] == t_stop:
+                if axis == 0:
+                    kx += step
+                else:
+                    kz += step
+                y = result.y_events[num_events + n][-1]
+                break
+        t0 = t_stop
+
+    return _merge_segments(segments, num_events, events is not None, t_eval)
+
+
+def _merge_segments(segments, num_events, has_events, t_eval):
+    _, first = segments[0]
+    merged = type(first)(first)
+
+    t = [first.t]
+    y = [first.y]
+    t_events = [list(te) for te in (first.t_events or [])][:num_events]
+    y_events = [list(ye) for ye in (first.y_events or [])][:num_events]
+    ts = list(first.sol.ts) if first.sol is not None else None
+    interpolants = list(first.sol.interpolants) if first.sol is not None else None
+
+    for t0, result in segments[1:]:
+        # Without t_eval every segment repeats the last point of the previous
+        start = 0 if t_eval is not None else 1
+        t.append(result.t[start:])
+        y.append(result.y[:, start:])
+
+        for n in range(num_events):
+            for te, ye in zip(result.t_events[n], result.y_events[n]):
+                # An event right on a zone boundary can fire again right
+                # after the restart
+                if t_events[n] and te - t_events[n][-1] <= 1e-9 * max(1.0, t0):
+                    continue
+                t_events[n].append(te)
+                y_events[n].append(ye)
+
+        if ts is not None:
+            ts.extend(result.sol.ts[1:])
+            interpolants.extend(result.sol.interpolants)
+
+        for key in ('nfev', 'njev', 'nlu'):
+            merged[key] += result[key]
+
+    last = segments[-1][1]
+    merged['t'] = np.concatenate(t)
+    merged['y'] = np.concatenate(y, axis=1)
+    if has_events:
+        merged['t_events'] = [np.array(te) for te in t_events]
+        merged['y_events'] = [
+            np.array(ye) if ye else np.empty((0, first.y.shape[0]))
+            for ye in y_events]
+    else:
+        merged['t_events'] = None
+        merged['y_events'] = None
+    if ts is not None:
+        merged['sol'] = OdeSolution(ts, interpolants)
+    merged['status'] = last.status
+    merged['message'] = last.message
+    merged['success'] = last.success
+    return merged
@@ -0,0 +1,155 @@
+import numpy as np
+
+# Upper bound on the size of the lookup table of a BreakpointIndex
+MAX_LOOKUP_CELLS = 4096
+
+
+class BreakpointIndex:
+    """Finds the segment of a sorted list of breakpoints containing a value in
+    constant time. The span of the breakpoints is divided into uniform cells,
+    each remembering the segment at its start, so a lookup is one division and
+    at most a few comparisons instead of a binary search.
+    """
+
+    def __init__(self, points) -> None:
+        self.points = np.asarray(points, dtype=float)
+        if self.points.ndim != 1 or self.points.size == 0:
+            raise Exception('Expecting a non-empty list of breakpoints')
+
+        gaps = np.diff(self.points)
+        if np.any(gaps <= 0.0):
+            raise Exception('Breakpoints must be strictly increasing')
+
+        self.origin = self.points[0]
+        if self.points.size == 1:
+            self.num_cells = 0
+            self.inv_width = 0.0
+            self.table = np.zeros(1, dtype=int)
+            self.max_per_cell = 0
+            return
+
+        # Cells no wider than the smallest gap hold at most one breakpoint
+        span = self.points[-1] - self.origin
+        self.num_cells = int(min(np.ceil(span / gaps.min()), MAX_LOOKUP_CELLS))
+        self.inv_width = self.num_cells / span
+
+        cell_starts = self.origin + np.arange(self.num_cells + 1) / self.inv_width
+        self.table = np.searchsorted(self.points, cell_starts, 'right') - 1
+        self.max_per_cell = int(np.max(np.diff(self.table), initial=0))
+
+    def __len__(self) -> int:
+        return self.points.size
+
+    def index(self, x):
+        """Returns the index of the last breakpoint not after `x`, or 0 if `x`
+        is before the first one. Accepts a float or an array.
+        """
+
+        last = self.points.size - 1
+        if np.ndim(x) == 0:
+            if x < self.origin or self.num_cells == 0:
+                return 0
+            c = (x - self.origin) * self.inv_width
+            i = last if c >= self.num_cells else self.table[int(c)]
+            # Rounding of the cell can put x just before its first breakpoint
+            if i > 0 and x < self.points[i]:
+                i -= 1
+            while i < last and x >= self.points[i + 1]:
+                i += 1
+            return int(i)
+
+        x = np.asarray(x, dtype=float)
+        c = np.clip((x - self.origin) * self.inv_width,
+                    0, self.num_cells).astype(int)
+        i = self.table[c]
+        i -= (i > 0) & (x < self.points[i])
+        for _ in range(self.max_per_cell):
+            i += (i < last) & (x >= self.points[np.minimum(i + 1, last)])
+        return i
+
+
+class WindProfile:
+    """Wind that changes along the range and with height.
+
+    Parameters
+    ----------
+    winds : array_like
+        Wind velocities in ft/s, shape (len(ranges), len(heights), 3). If only
+        one of `ranges` or `heights` is given, shape (len(ranges), 3) or
+        (len(heights), 3) is also accepted.
+    ranges : array_like
+        Increasing downrange distances in ft. Without interpolation these are
+        the starts of the range zones, the first zone extending backwards.
+    heights : array_like
+        Increasing heights in ft, like `ranges` but for the height bands
+    interpolate : bool
+        Interpolate linearly between the breakpoints instead of holding the
+        wind constant within each zone. Beyond the first and last breakpoint
+        the wind is held constant.
+    """
+
+    def __init__(
+        self,
+        winds,
+        ranges=(0.0,),
+        heights=(0.0,),
+        interpolate: bool = False
+    ) -> None:
+        self.range_index = BreakpointIndex(ranges)
+        self.height_index = BreakpointIndex(heights)
+        self.interpolate = interpolate
+
+        shape = (len(self.range_index), len(self.height_index), 3)
+        winds = np.asarray(winds, dtype=float)
+        if winds.shape != shape:
+            if winds.size != np.prod(shape):
+                raise Exception(f'Expecting winds of shape {shape}')
+            winds = winds.reshape(shape)
+        self.winds = winds
+
+    @property
+    def range_boundaries(self) -> np.ndarray:
+        """Ranges in ft where the wind or its slope changes abruptly."""
+        if self.interpolate:
+            return self.range_index.points
+        return self.range_index.points[1:]
+
+    @property
+    def height_boundaries(self) -> np.ndarray:
+        """Heights in ft where the wind or its slope changes abruptly."""
+        if self.interpolate:
+            return self.height_index.points
+        return self.height_index.points[1:]
+
+    def zone(self, x, z):
+        """Returns the indices of the range zone and height band containing
+        the point. Accepts floats or arrays.
+        """
+        return self.range_index.index(x), self.height_index.index(z)
+
+    def __call__(self, x, z) -> np.ndarray:
+        """Wind velocity in ft/s at downrange distance `x` and height `z`.
+        Accepts floats, giving shape (3,), or arrays, giving shape (..., 3).
+        """
+
+        i, j = self.zone(x, z)
+        if not self.interpolate:
+            return self.winds[i, j]
+
+        a, i1 = _fraction(self.range_index.points, i, x)
+        b, j1 = _fraction(self.height_index.points, j, z)
+        a = np.expand_dims(a, -1)
+        b = np.expand_dims(b, -1)
+        return ((1.0 - a) * ((1.0 - b) * self.winds[i, j] + b * self.winds[i, j1]) +
+                a * ((1.0 - b) * self.winds[i1, j] + b * self.winds[i1, j1]))
+
+
+def _fraction(points, i, x):
+    # Position of `x` within the segment starting at `i`, clamped to [0, 1]
+    last = points.size - 1
+    i1 = np.minimum(i + 1, last)
+    width = points[i1] - points[i]
+    safe_width = np.where(width > 0.0, width, 1.0)
+    a = np.clip((x - points[i]) / safe_width, 0.0, 1.0)
+    a = np.where(width > 0.0, a, 0.0)
+    return a, i1
@@ -3,7 +3,7 @@ from ballistics.trajectory import *
 import numpy as np
 
 def main():
-    for method in ('DOP853', 'LSODA', 'BeemansAlgorithm'):
+    for method in ('auto', 'DOP853', 'LSODA', 'BeemansAlgorithm'):
         pm_traj = PointMassTrajectory(parse_drag_table('ballistics/data/mcg7.txt'))
         muzzle_speed = 2970
         bc = 0.371
@@ -57,25 +57,13 @@ def main():
                     drop,
                     windage,
                     speed,
-                    t
+                    t[0]
                 )
             )
         print('')
         
-    # shooterscalculator
-    #  100,     0.00, 2843, 0.10
-    #  200,    -2.80, 2720, 0.21
-    #  600,   -65.78, 2255, 0.70
-    # 1000,  -239.87, 1836, 1.29
-    # 1600,  -844.97, 1291, 2.46
-    # 2000, -1646.26, 1056, 3.50
-
-    # Hornady
-    #  200,    -2.80, 2717
-    #  600,      -66, 2246
-    # 1000,   -241.3, 1823
-    # 1600,   -853.9, 1273
-    # 2000,  -1670.2, 1049
+    # The shooterscalculator and Hornady tables for this load are in
+    # ballistics/data/reference, run `python -m ballistics.harness` to compare
 
 
 if __name__ == '__main__':